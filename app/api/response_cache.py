@@ -0,0 +1,163 @@
+"""Two-tier HTTP response cache for the Rick and Morty API client.
+
+An in-memory LRU sits in front of a SQLite file (next to the notes DB). Entries
+carry the response validators (`ETag` / `Last-Modified`) so stale entries can be
+revalidated with a conditional GET instead of a full download.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode, urlparse
+
+CACHE_DB_PATH = "db/http_cache.db"
+
+# Seconds an entry is served without revalidation, keyed by the first path segment
+# after `/api` (the resource). The public data changes very rarely.
+DEFAULT_TTLS: Dict[str, float] = {
+    "location": 24 * 3600,
+    "character": 24 * 3600,
+    "episode": 24 * 3600,
+}
+DEFAULT_TTL_S = 3600.0
+
+
+@dataclass
+class CacheEntry:
+    data: Any
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    revalidated: int = 0
+    network_calls: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "network_calls": self.network_calls,
+        }
+
+
+@dataclass
+class ResponseCache:
+    path: Optional[str] = CACHE_DB_PATH
+    ttls: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_TTLS))
+    default_ttl_s: float = DEFAULT_TTL_S
+    memory_entries: int = 2048
+
+    def __post_init__(self) -> None:
+        self.stats = CacheStats()
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.path:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS http_cache (
+                        key TEXT PRIMARY KEY,
+                        body TEXT,
+                        etag TEXT,
+                        last_modified TEXT,
+                        fetched_at REAL
+                    )
+                """)
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        if not params:
+            return url
+        return f"{url}?{urlencode(sorted(params.items()))}"
+
+    def ttl_for(self, url: str) -> float:
+        segments = [s for s in urlparse(url).path.split("/") if s]
+        if "api" in segments:
+            segments = segments[segments.index("api") + 1:]
+        resource = segments[0] if segments else ""
+        return self.ttls.get(resource, self.default_ttl_s)
+
+    def is_fresh(self, key: str, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched_at < self.ttl_for(key)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM http_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            entry = CacheEntry(data=json.loads(row[0]), etag=row[1], last_modified=row[2], fetched_at=row[3])
+            self._remember(key, entry)
+            return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?)",
+                        (key, json.dumps(entry.data), entry.etag, entry.last_modified, entry.fetched_at),
+                    )
+
+    def touch(self, key: str, entry: CacheEntry) -> None:
+        """Mark a revalidated entry as fresh again without rewriting its body."""
+        entry.fetched_at = time.time()
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE http_cache SET fetched_at = ? WHERE key = ?",
+                        (entry.fetched_at, key),
+                    )
+
+    def conditional_headers(self, entry: Optional[CacheEntry]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if entry is None:
+            return headers
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def record(self, counter: str) -> None:
+        with self._lock:
+            setattr(self.stats, counter, getattr(self.stats, counter) + 1)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM http_cache")
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
@@ -2,56 +2,390 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import json
+import threading
 import time
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
 
+import aiohttp
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from app.api.response_cache import CacheEntry, ResponseCache
+from app.metrics import add_bytes, collect, current_metrics, propagate, traced
+from app.persistence.snapshot_store import SnapshotStore
+
 BASE_URL = "https://rickandmortyapi.com/api"
 
+# Shared retry policy for the sync (urllib3 `Retry`) and async clients.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_BACKOFF_FACTOR = 0.5
+
+# Number of IDs sent per `/character/1,2,3` request; keeps URLs comfortably short.
+CHARACTER_BATCH_SIZE = 100
+
+
+def id_from_url(url: str) -> int:
+    """Extract the trailing numeric ID from a resource URL like `.../character/42`."""
+    return int(url.rstrip("/").rsplit("/", 1)[-1])
+
+
+T = TypeVar("T")
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces request starts at most `rate_per_s` apart."""
+
+    def __init__(self, rate_per_s: float) -> None:
+        self._interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self._interval
+        delay = start_at - now
+        if delay > 0:
+            time.sleep(delay)
+
 
 @dataclass
 class RickMortyClient:
     base_url: str = BASE_URL
     timeout_s: float = 20.0
     max_retries: int = 3
-    backoff_s: float = 0.5
+    batch_size: int = CHARACTER_BATCH_SIZE
+    # Pagination concurrency and politeness; replaces the old fixed sleep per page.
+    max_workers: int = 4
+    requests_per_s: float = 10.0
+    # Optional response cache; `None` means every call goes to the network.
+    cache: Optional[ResponseCache] = field(default=None, repr=False)
+    # Optional local snapshot; synced resources are served from it without any HTTP.
+    snapshot: Optional[SnapshotStore] = field(default=None, repr=False)
 
     def __post_init__(self) -> None:
+        self._rate_limiter = RateLimiter(self.requests_per_s)
         self._session = requests.Session()
         retries = Retry(
             total=self.max_retries,
             connect=self.max_retries,
             read=self.max_retries,
             status=self.max_retries,
-            backoff_factor=0.5,
-            status_forcelist=(429, 500, 502, 503, 504),
+            backoff_factor=RETRY_BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUSES,
             allowed_methods=("GET",),
         )
-        adapter = HTTPAdapter(max_retries=retries)
+        pool_size = max(10, self.max_workers)
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size)
         self._session.mount("https://", adapter)
         self._session.mount("http://", adapter)
 
-    def _get_json(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        resp = self._session.get(url, params=params, timeout=self.timeout_s)
+    @traced("api.get_json")
+    def _get_json(self, url: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        if self.cache is None:
+            self._rate_limiter.acquire()
+            resp = self._session.get(url, params=params, timeout=self.timeout_s)
+            resp.raise_for_status()
+            add_bytes("api.get_json", len(resp.content))
+            return resp.json()
+
+        key = self.cache.make_key(url, params)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(key, entry):
+            self.cache.record("hits")
+            return entry.data
+
+        self.cache.record("misses")
+        self.cache.record("network_calls")
+        self._rate_limiter.acquire()
+        resp = self._session.get(
+            url, params=params, timeout=self.timeout_s, headers=self.cache.conditional_headers(entry)
+        )
+        if resp.status_code == 304 and entry is not None:
+            self.cache.record("revalidated")
+            self.cache.touch(key, entry)
+            return entry.data
+
         resp.raise_for_status()
-        return resp.json()
+        add_bytes("api.get_json", len(resp.content))
+        data = resp.json()
+        self.cache.put(key, CacheEntry(
+            data=data,
+            fetched_at=time.time(),
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+        ))
+        return data
 
-    def get_all_locations(self) -> List[Dict[str, Any]]:
-        locations: List[Dict[str, Any]] = []
-        url: Optional[str] = f"{self.base_url.rstrip('/')}/location"
+    def cache_stats(self) -> Dict[str, int]:
+        """Hit/miss/network counters for the response cache (empty when caching is off)."""
+        return self.cache.stats.as_dict() if self.cache is not None else {}
 
-        while url:
-            # Small delay to be polite and reduce chance of being reset.
-            time.sleep(self.backoff_s)
-            data = self._get_json(url)
-            locations.extend(data.get("results", []))
-            url = (data.get("info") or {}).get("next")
+    def _get_all_pages(self, resource: str, parallel: bool = True) -> List[Dict[str, Any]]:
+        """Collect every result of a paginated resource (`location`, `character`, `episode`).
 
-        return locations
+        Page 1 tells us `info.pages`; in parallel mode the remaining pages are fetched
+        concurrently on the shared session, bounded by `max_workers`. The serial mode
+        follows `info.next` links one page at a time.
+        """
+        if self.snapshot is not None and self.snapshot.has(resource):
+            return self.snapshot.get_all(resource)
+
+        url = f"{self.base_url.rstrip('/')}/{resource}"
+        first = self._get_json(url)
+        results: List[Dict[str, Any]] = list(first.get("results", []))
+        info = first.get("info") or {}
+
+        if not parallel or self.max_workers <= 1:
+            next_url: Optional[str] = info.get("next")
+            while next_url:
+                data = self._get_json(next_url)
+                results.extend(data.get("results", []))
+                next_url = (data.get("info") or {}).get("next")
+            return results
+
+        pages = int(info.get("pages") or 1)
+        if pages > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                # `map` preserves page order regardless of completion order.
+                fetch_page = propagate(lambda page: self._get_json(url, params={"page": page}))
+                for data in pool.map(fetch_page, range(2, pages + 1)):
+                    results.extend(data.get("results", []))
+
+        return results
+
+    def get_all_locations(self, parallel: bool = True) -> List[Dict[str, Any]]:
+        return self._get_all_pages("location", parallel=parallel)
+
+    def get_all_characters(self, parallel: bool = True) -> List[Dict[str, Any]]:
+        return self._get_all_pages("character", parallel=parallel)
+
+    def get_all_episodes(self, parallel: bool = True) -> List[Dict[str, Any]]:
+        return self._get_all_pages("episode", parallel=parallel)
 
     def get_character_by_url(self, url: str) -> Dict[str, Any]:
         return self._get_json(url)
+
+    def get_by_ids(self, resource: str, ids: List[int]) -> List[Dict[str, Any]]:
+        """Fetch records by ID via the multi-ID endpoint (`/character/1,2,3`).
+
+        Results come back in the same order as `ids` (unknown IDs are dropped);
+        duplicates are fetched once, and IDs in the snapshot are not fetched at all.
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        by_id: Dict[int, Dict[str, Any]] = {}
+        if self.snapshot is not None:
+            by_id.update(self.snapshot.get_many(resource, unique_ids))
+        missing = [i for i in unique_ids if i not in by_id]
+
+        for start in range(0, len(missing), self.batch_size):
+            chunk = missing[start:start + self.batch_size]
+            url = f"{self.base_url.rstrip('/')}/{resource}/{','.join(str(i) for i in chunk)}"
+            try:
+                data = self._get_json(url)
+            except requests.HTTPError as e:
+                # A single unknown ID is a 404, where a multi-ID request just leaves it out.
+                if len(chunk) == 1 and e.response is not None and e.response.status_code == 404:
+                    continue
+                raise
+            # A single ID returns a bare object instead of a list.
+            if isinstance(data, dict):
+                data = [data]
+            for item in data:
+                by_id[item["id"]] = item
+
+        return [by_id[i] for i in ids if i in by_id]
+
+    def get_characters_by_urls(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """Resolve many character URLs via the multi-ID endpoint, preserving input order."""
+        return self.get_by_ids("character", [id_from_url(url) for url in urls])
+
+
+class AsyncConnection(NamedTuple):
+    """An open aiohttp session plus the semaphore bounding its in-flight requests.
+
+    Both are bound to the event loop that created them, so a connection must
+    only be used on that loop (and never outlive its `async with client.connect()` block).
+    """
+
+    session: aiohttp.ClientSession
+    semaphore: asyncio.Semaphore
+
+
+@dataclass
+class AsyncRickMortyClient:
+    """asyncio counterpart of `RickMortyClient` built on a pooled aiohttp session.
+
+    One instance can be shared across threads and event loops. Async callers
+    open a connection on their own loop:
+    `async with client.connect() as conn: await client.get_characters_by_urls(conn, urls)`.
+    The `*_sync` wrappers for blocking code (e.g. Streamlit) instead submit to the
+    client's own loop thread, started on first use, whose one long-lived
+    connection keeps pooled connections alive across calls.
+    """
+
+    base_url: str = BASE_URL
+    timeout_s: float = 20.0
+    max_retries: int = 3
+    batch_size: int = CHARACTER_BATCH_SIZE
+    # Upper bound on in-flight requests, and on kept-alive connections in the pool.
+    max_concurrency: int = 8
+    pool_size: int = 16
+    cache: Optional[ResponseCache] = field(default=None, repr=False)
+    snapshot: Optional[SnapshotStore] = field(default=None, repr=False)
+    # Loop thread and connection behind the `*_sync` wrappers; see `_background`.
+    _loop: Optional[asyncio.AbstractEventLoop] = field(default=None, init=False, repr=False, compare=False)
+    _thread: Optional[threading.Thread] = field(default=None, init=False, repr=False, compare=False)
+    _conn: Optional[AsyncConnection] = field(default=None, init=False, repr=False, compare=False)
+    _loop_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+
+    async def _open(self) -> AsyncConnection:
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout_s),
+        )
+        return AsyncConnection(session, asyncio.Semaphore(self.max_concurrency))
+
+    @contextlib.asynccontextmanager
+    async def connect(self) -> AsyncIterator[AsyncConnection]:
+        conn = await self._open()
+        try:
+            yield conn
+        finally:
+            await conn.session.close()
+
+    async def _request(
+        self, conn: AsyncConnection, url: str, params: Optional[Dict[str, Any]], headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str], Any]:
+        """GET with the same retry policy as the sync client's urllib3 `Retry`."""
+        for attempt in range(self.max_retries + 1):
+            delay = RETRY_BACKOFF_FACTOR * (2 ** attempt)
+            try:
+                async with conn.semaphore:
+                    async with conn.session.get(url, params=params, headers=headers) as resp:
+                        if resp.status in RETRY_STATUSES and attempt < self.max_retries:
+                            retry_after = resp.headers.get("Retry-After", "")
+                            if retry_after.isdigit():
+                                delay = float(retry_after)
+                        elif resp.status == 304:
+                            return resp.status, dict(resp.headers), None
+                        else:
+                            resp.raise_for_status()
+                            body = await resp.read()
+                            add_bytes("api.get_json", len(body))
+                            return resp.status, dict(resp.headers), json.loads(body)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+            await asyncio.sleep(delay)
+
+        raise RuntimeError("unreachable")  # the last attempt always returns or raises
+
+    @traced("api.get_json")
+    async def _get_json(self, conn: AsyncConnection, url: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        if self.cache is None:
+            _, _, data = await self._request(conn, url, params, {})
+            return data
+
+        key = self.cache.make_key(url, params)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(key, entry):
+            self.cache.record("hits")
+            return entry.data
+
+        self.cache.record("misses")
+        self.cache.record("network_calls")
+        status, headers, data = await self._request(conn, url, params, self.cache.conditional_headers(entry))
+        if status == 304 and entry is not None:
+            self.cache.record("revalidated")
+            self.cache.touch(key, entry)
+            return entry.data
+
+        self.cache.put(key, CacheEntry(
+            data=data,
+            fetched_at=time.time(),
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+        ))
+        return data
+
+    async def get_character_by_url(self, conn: AsyncConnection, url: str) -> Dict[str, Any]:
+        return await self._get_json(conn, url)
+
+    async def _get_chunk(self, conn: AsyncConnection, root: str, chunk: List[int]) -> Any:
+        try:
+            return await self._get_json(conn, f"{root}/{','.join(str(i) for i in chunk)}")
+        except aiohttp.ClientResponseError as e:
+            # A single unknown ID is a 404, where a multi-ID request just leaves it out.
+            if len(chunk) == 1 and e.status == 404:
+                return []
+            raise
+
+    async def get_characters_by_urls(self, conn: AsyncConnection, urls: List[str]) -> List[Dict[str, Any]]:
+        """Resolve many character URLs; multi-ID chunks are fetched concurrently."""
+        ids = [id_from_url(url) for url in urls]
+        unique_ids = list(dict.fromkeys(ids))
+        by_id: Dict[int, Dict[str, Any]] = {}
+        if self.snapshot is not None:
+            by_id.update(self.snapshot.get_many("character", unique_ids))
+        missing = [i for i in unique_ids if i not in by_id]
+        chunks = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        root = self.base_url.rstrip("/")
+
+        pages = await asyncio.gather(*(self._get_chunk(conn, f"{root}/character", chunk) for chunk in chunks))
+        for data in pages:
+            if isinstance(data, dict):
+                data = [data]
+            for character in data:
+                by_id[character["id"]] = character
+
+        return [by_id[i] for i in ids if i in by_id]
+
+    def _background(self) -> Tuple[asyncio.AbstractEventLoop, AsyncConnection]:
+        """The loop thread serving the `*_sync` wrappers and its connection, started on first use."""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="rick-morty-async-client", daemon=True)
+                thread.start()
+                self._conn = asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                self._loop, self._thread = loop, thread
+            return self._loop, self._conn
+
+    def _run_sync(self, call: Callable[[AsyncConnection], Awaitable[T]]) -> T:
+        loop, conn = self._background()
+        metrics = current_metrics()
+
+        async def attributed() -> T:
+            # Tasks on the loop thread don't inherit the caller's context; carry its collector over.
+            with collect(metrics):
+                return await call(conn)
+        return asyncio.run_coroutine_threadsafe(attributed(), loop).result()
+
+    def close(self) -> None:
+        """Close the `*_sync` wrappers' connection and stop their loop thread (restarted if used again)."""
+        with self._loop_lock:
+            loop, thread, conn = self._loop, self._thread, self._conn
+            self._loop = self._thread = self._conn = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(conn.session.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    def get_characters_by_urls_sync(self, urls: List[str]) -> List[Dict[str, Any]]:
+        return self._run_sync(lambda conn: self.get_characters_by_urls(conn, urls))
+
+    def get_character_by_url_sync(self, url: str) -> Dict[str, Any]:
+        return self._run_sync(lambda conn: self.get_character_by_url(conn, url))
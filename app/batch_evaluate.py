@@ -0,0 +1,177 @@
+"""Offline batch evaluation over every location.
+
+Generates a summary for each location with `LLMService`, scores it with
+`Evaluator` (optionally including the LLM judge) and appends one JSON line per
+location to the output file. Locations already recorded as successful are
+skipped, so an interrupted run resumes where it stopped:
+
+    python app/batch_evaluate.py --output db/batch_eval.jsonl --workers 4 --judge
+
+`--metrics FILE` writes per-stage call counts, time, bytes and tokens for the
+run (Prometheus text if FILE ends in `.prom`, JSON otherwise); `--profile FILE`
+additionally records a cProfile of the main thread.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Set
+
+# Ensure project root is on sys.path so `import app...` works when run as a script.
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(_PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(_PROJECT_ROOT))
+
+from app.api.response_cache import ResponseCache
+from app.api.rick_morty_client import RateLimiter, RickMortyClient
+from app.evaluation.evaluator import Evaluator
+from app.llm.embeddings import EmbeddingService
+from app.llm.llm_service import LLMService
+from app.llm.openai_scheduler import PRIORITY_BATCH
+from app.metrics import Metrics, collect, profiled, propagate
+from app.persistence.notes_repository import NotesRepository
+from app.persistence.snapshot_store import SnapshotStore
+
+DEFAULT_OUTPUT = "db/batch_eval.jsonl"
+
+
+def repair_trailing_line(path: Path) -> None:
+    """Drop a partial last line left by a run killed mid-write.
+
+    Otherwise the next record would be appended onto the fragment and become
+    unparseable too.
+    """
+    if not path.exists():
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def load_completed(path: Path) -> Set[int]:
+    """IDs of locations that already have a successful record in `path`."""
+    done: Set[int] = set()
+    if not path.exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line.
+                continue
+            if record.get("status") == "ok":
+                done.add(record["location_id"])
+    return done
+
+
+class BatchRunner:
+
+    def __init__(self, output: Path, workers: int = 4, llm_rate_per_s: float = 1.0,
+                 judge: bool = False, refresh: bool = False):
+        self.output = output
+        self.workers = workers
+        self.judge = judge
+        self.refresh = refresh
+        snapshot = SnapshotStore() if SnapshotStore.exists() else None
+        self.client = RickMortyClient(cache=ResponseCache(), snapshot=snapshot)
+        self.notes_repo = NotesRepository()
+        # Batch lane: yields to interactive calls sharing the scheduler and leaves them headroom.
+        self.llm = LLMService(priority=PRIORITY_BATCH)
+        self.evaluator = Evaluator(embedding_service=EmbeddingService(priority=PRIORITY_BATCH))
+        # Paces location starts so a wide worker pool doesn't burst past the provider quota.
+        self.llm_limiter = RateLimiter(llm_rate_per_s)
+        self.metrics = Metrics()
+        self._write_lock = threading.Lock()
+
+    def evaluate_location(self, location: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        record: Dict[str, Any] = {
+            "location_id": location["id"],
+            "name": location["name"],
+            "residents": len(location.get("residents") or []),
+            "model": self.llm.model,
+        }
+        try:
+            characters = self.client.get_characters_by_urls(location.get("residents") or [])
+            notes_by_id = self.notes_repo.get_notes_for_characters([c["id"] for c in characters])
+            residents = [
+                {"character": c, "notes": [n for n, _ in notes_by_id[c["id"]]]} for c in characters
+            ]
+            self.llm_limiter.acquire()
+            summary = self.llm.generate_location_summary(location, residents, refresh=self.refresh)
+            result = self.evaluator.evaluate_pipeline(
+                summary, location, residents=residents,
+                llm=self.llm if self.judge else None, refresh=self.refresh,
+            )
+            # A failed or timed-out stage leaves a gap in the scores; keep it eligible for a retry.
+            status = "partial" if result.errors else "ok"
+            record.update(status=status, summary=summary, scores=result.as_dict())
+        except Exception as e:
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        record["elapsed_s"] = round(time.perf_counter() - started, 3)
+        return record
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with self._write_lock, open(self.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def run(self, limit: int = 0) -> Dict[str, int]:
+        with collect(self.metrics):
+            return self._run(limit)
+
+    def _run(self, limit: int) -> Dict[str, int]:
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        repair_trailing_line(self.output)
+        done = load_completed(self.output)
+        locations = [loc for loc in self.client.get_all_locations() if loc["id"] not in done]
+        if limit:
+            locations = locations[:limit]
+        print(f"{len(done)} locations already done, {len(locations)} to evaluate", file=sys.stderr)
+
+        counts = {"ok": 0, "partial": 0, "error": 0, "skipped": len(done)}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(propagate(self.evaluate_location), loc) for loc in locations]
+            for future in as_completed(futures):
+                record = future.result()
+                self.write(record)
+                counts[record["status"]] += 1
+                print(f"[{record['status']}] {record['name']} ({record['elapsed_s']}s)", file=sys.stderr)
+        return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarize and evaluate every Rick & Morty location.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSONL results file (appended to, resumable)")
+    parser.add_argument("--workers", type=int, default=4, help="locations processed concurrently")
+    parser.add_argument("--rate", type=float, default=1.0, help="max locations started per second")
+    parser.add_argument("--judge", action="store_true", help="also run the LLM judge")
+    parser.add_argument("--refresh", action="store_true", help="ignore cached LLM responses")
+    parser.add_argument("--limit", type=int, default=0, help="evaluate at most N pending locations")
+    parser.add_argument("--metrics", help="write per-stage metrics here (.prom for Prometheus text, else JSON)")
+    parser.add_argument("--profile", help="write a cProfile of the run to this file")
+    args = parser.parse_args()
+
+    runner = BatchRunner(
+        Path(args.output), workers=args.workers, llm_rate_per_s=args.rate,
+        judge=args.judge, refresh=args.refresh,
+    )
+    with profiled(enabled=bool(args.profile), output=args.profile):
+        counts = runner.run(limit=args.limit)
+    print(json.dumps(counts), file=sys.stderr)
+    if args.metrics:
+        metrics_path = Path(args.metrics)
+        metrics_path.parent.mkdir(parents=True, exist_ok=True)
+        export = runner.metrics.to_prometheus() if metrics_path.suffix == ".prom" else runner.metrics.to_json()
+        metrics_path.write_text(export, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
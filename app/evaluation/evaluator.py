@@ -1,10 +1,50 @@
 
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
 from app.llm.embeddings import EmbeddingService
+from app.metrics import propagate, traced
 import numpy as np
 
+# Seconds each pipeline stage may take before it is reported as timed out.
+DEFAULT_STAGE_TIMEOUTS = {"rubric": 5.0, "similarity": 30.0, "judge": 60.0}
+
+
+def parse_judge_response(judge_response):
+    # The judge is asked for JSON; fall back to showing the raw text as the verdict
+    try:
+        return json.loads(judge_response)
+    except Exception:
+        return {"factual": "-", "creativity": "-", "completeness": "-", "verdict": judge_response}
+
+
+@dataclass
+class EvaluationResult:
+    """Merged output of the evaluation pipeline; failed or slow stages are left empty."""
+    rubric: Dict[str, Any] = field(default_factory=dict)
+    semantic_similarity: Optional[float] = None
+    judge: Optional[Dict[str, Any]] = None
+    errors: Dict[str, str] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def as_dict(self):
+        # Same shape as `Evaluator.evaluate`, plus the judge and per-stage diagnostics
+        merged = dict(self.rubric)
+        if self.semantic_similarity is not None:
+            merged["semantic_similarity"] = round(self.semantic_similarity, 3)
+        merged["judge"] = self.judge
+        merged["errors"] = dict(self.errors)
+        merged["timings"] = dict(self.timings)
+        return merged
+
+
 class Evaluator:
-    def __init__(self):
-        self.embedding_service = EmbeddingService()
+    def __init__(self, embedding_service=None, stage_timeouts=None):
+        self.embedding_service = embedding_service or EmbeddingService()
+        self.stage_timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {})}
 
     def score_factual(self, summary, location):
         # Simple heuristic: location name and resident names present
@@ -49,8 +89,7 @@ class Evaluator:
                 f"Current location: {(c.get('location') or {}).get('name', '-')}, Episodes: {len(c.get('episode') or [])}"
             )
         all_details = " ".join(details)
-        emb1 = self.embedding_service.embed(summary)
-        emb2 = self.embedding_service.embed(all_details)
+        emb1, emb2 = self.embedding_service.embed_many([summary, all_details])
         return float(self.embedding_service.cosine_similarity(emb1, emb2))
 
     def rubric_evaluation(self, summary, location):
@@ -71,3 +110,48 @@ class Evaluator:
         sim = self.semantic_similarity(summary, residents or [])
         rubric["semantic_similarity"] = round(sim, 3)
         return rubric
+
+    @traced("eval.pipeline")
+    def evaluate_pipeline(self, summary, location, residents=None, llm=None, refresh=False):
+        # Run the rubric, embedding similarity and (if an LLMService is given) the LLM judge
+        # concurrently. Latency is bounded by the slowest stage rather than their sum, and a
+        # stage that fails or exceeds its timeout only leaves its own part of the result empty.
+        residents = residents or []
+        stages = {
+            "rubric": lambda: self.rubric_evaluation(summary, location),
+            "similarity": lambda: self.semantic_similarity(summary, residents),
+        }
+        if llm is not None:
+            stages["judge"] = lambda: parse_judge_response(
+                llm.generate_judge_verdict(llm.build_judge_prompt(location, residents, summary), refresh=refresh)
+            )
+
+        result = EvaluationResult()
+
+        def timed(name, fn):
+            started = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                result.timings[name] = round(time.perf_counter() - started, 3)
+
+        pool = ThreadPoolExecutor(max_workers=len(stages))
+        started = time.monotonic()
+        futures = {name: pool.submit(propagate(timed), name, fn) for name, fn in stages.items()}
+        outputs = {}
+        for name, future in futures.items():
+            remaining = max(0.0, started + self.stage_timeouts[name] - time.monotonic())
+            try:
+                outputs[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                result.errors[name] = f"timed out after {self.stage_timeouts[name]:g}s"
+            except Exception as e:
+                result.errors[name] = f"{type(e).__name__}: {e}"
+        # Don't block on stages that timed out; their threads finish in the background.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+        result.rubric = outputs.get("rubric", {})
+        if "similarity" in outputs:
+            result.semantic_similarity = float(outputs["similarity"])
+        result.judge = outputs.get("judge")
+        return result
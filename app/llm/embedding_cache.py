@@ -0,0 +1,165 @@
+"""Content-addressed cache for embedding vectors.
+
+Vectors are keyed by sha256(model, text) and kept in an in-process LRU backed by
+a SQLite file of float32 blobs. The disk tier is bounded by `max_bytes`; the
+least recently used vectors are evicted first.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+EMBEDDING_CACHE_PATH = "db/embeddings.db"
+
+
+class EmbeddingCache:
+
+    def __init__(
+        self,
+        path: Optional[str] = EMBEDDING_CACHE_PATH,
+        memory_entries: int = 4096,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS embeddings (
+                        key TEXT PRIMARY KEY,
+                        vector BLOB,
+                        nbytes INT,
+                        last_used REAL
+                    )
+                """)
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = self.make_key(model, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is None and self._conn is not None:
+                row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    with self._conn:
+                        self._conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            if vector is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, vector)
+            return vector
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for whichever of `texts` are present, keyed by text.
+
+        Memory misses are looked up in one query, and their `last_used` bumped in
+        one update, instead of a round trip per text.
+        """
+        keys = {text: self.make_key(model, text) for text in dict.fromkeys(texts)}
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for text, key in keys.items():
+                vector = self._memory.get(key)
+                if vector is not None:
+                    found[text] = vector
+            missing = {key: text for text, key in keys.items() if text not in found}
+            if missing and self._conn is not None:
+                # json_each sidesteps SQLite's bound-parameter limit for large batches.
+                key_list = json.dumps(list(missing))
+                rows = self._conn.execute(
+                    "SELECT key, vector FROM embeddings WHERE key IN (SELECT value FROM json_each(?))", (key_list,)
+                ).fetchall()
+                for key, blob in rows:
+                    found[missing[key]] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    with self._conn:
+                        self._conn.execute(
+                            "UPDATE embeddings SET last_used = ? WHERE key IN (SELECT value FROM json_each(?))",
+                            (time.time(), json.dumps([key for key, _ in rows])),
+                        )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            for text, vector in found.items():
+                self._remember(keys[text], vector)
+        return found
+
+    def put(self, model: str, text: str, vector: np.ndarray) -> np.ndarray:
+        return self.put_many(model, [text], [vector])[0]
+
+    def put_many(self, model: str, texts: List[str], vectors: List[np.ndarray]) -> List[np.ndarray]:
+        """Store several vectors in one transaction."""
+        stored = [np.asarray(v, dtype=np.float32) for v in vectors]
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, stored):
+                key = self.make_key(model, text)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes(), vector.nbytes, now))
+            if self._conn is not None and rows:
+                with self._conn:
+                    self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+                self._evict()
+        return stored
+
+    def bytes_used(self) -> int:
+        if self._conn is None:
+            return sum(v.nbytes for v in self._memory.values())
+        with self._lock:
+            return int(self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0])
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio(), 3),
+            "bytes_used": self.bytes_used(),
+        }
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used until we're back under budget.
+        to_free = total - self.max_bytes
+        doomed = []
+        for key, nbytes in self._conn.execute("SELECT key, nbytes FROM embeddings ORDER BY last_used"):
+            doomed.append((key,))
+            to_free -= nbytes
+            if to_free <= 0:
+                break
+        with self._conn:
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
@@ -1,19 +1,90 @@
 """Embeddings utilities."""
 
+from typing import List, Optional
+
 import openai
 import numpy as np
 
+from app.llm.embedding_cache import EmbeddingCache
+from app.llm.llm_service import estimate_tokens
+from app.llm.openai_scheduler import PRIORITY_INTERACTIVE, OpenAIScheduler, default_scheduler
+from app.metrics import add_tokens, traced
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Maximum number of inputs OpenAI accepts in a single embeddings request.
+MAX_BATCH_SIZE = 2048
+
+
+def _total_tokens(response) -> int:
+    return getattr(getattr(response, "usage", None), "total_tokens", 0) or 0
+
 
 class EmbeddingService:
 
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = MAX_BATCH_SIZE,
+        scheduler: Optional[OpenAIScheduler] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ):
+        self.model = model
+        # Unchanged texts are served from the cache instead of the network.
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        # Shared with the chat calls so both count against the same quota.
+        self.scheduler = scheduler if scheduler is not None else default_scheduler()
+        self.priority = priority
+
+    @traced("embeddings.embed")
     def embed(self, text):
+        cached = self.cache.get(self.model, text)
+        if cached is not None:
+            return cached
         # openai>=1.0.0 embedding API
-        response = openai.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
+        response = self.scheduler.submit(
+            lambda: openai.embeddings.create(
+                model=self.model,
+                input=text
+            ),
+            tokens=estimate_tokens(text),
+            priority=self.priority,
+            key=("embed", self.cache.make_key(self.model, text)),
         )
+        add_tokens("embeddings.embed", _total_tokens(response))
         # response.data is a list of objects with 'embedding' key
-        return np.array(response.data[0].embedding)
+        return self.cache.put(self.model, text, np.array(response.data[0].embedding))
+
+    @traced("embeddings.embed_many")
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Embed many texts, returning an `(n, d)` float32 matrix in input order.
+
+        Identical texts are embedded once, cached texts are not sent at all, and
+        the rest go out in as few requests as the provider's batch limit allows.
+        """
+        unique = list(dict.fromkeys(texts))
+        vectors = self.cache.get_many(self.model, unique)
+        missing = [text for text in unique if text not in vectors]
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            response = self.scheduler.submit(
+                lambda: openai.embeddings.create(model=self.model, input=batch),
+                tokens=sum(estimate_tokens(t) for t in batch),
+                priority=self.priority,
+                key=("embed_many", self.model, tuple(batch)),
+            )
+            add_tokens("embeddings.embed_many", _total_tokens(response))
+            # Results carry their input index; don't rely on response ordering.
+            ordered = sorted(response.data, key=lambda d: d.index)
+            stored = self.cache.put_many(self.model, batch, [d.embedding for d in ordered])
+            vectors.update(zip(batch, stored))
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([vectors[text] for text in texts])
 
     def cosine_similarity(self, a, b):
         return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
@@ -0,0 +1,122 @@
+"""Persistent cache for chat-completion responses.
+
+Keyed by sha256(model, temperature, normalised prompt), so re-asking the same
+question (same location, residents and notes) is answered locally. Entries
+expire after `ttl_s`; the disk tier keeps at most `max_entries`, dropping the
+least recently used. Token usage of cached answers is recorded so we can report
+how many tokens the cache saved.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+LLM_CACHE_PATH = "db/llm_cache.db"
+
+
+def normalise_prompt(prompt: str) -> str:
+    """Collapse whitespace so cosmetic prompt edits don't defeat the cache."""
+    return re.sub(r"\s+", " ", prompt or "").strip()
+
+
+class LLMCache:
+
+    def __init__(
+        self,
+        path: Optional[str] = LLM_CACHE_PATH,
+        ttl_s: float = 7 * 24 * 3600,
+        memory_entries: int = 256,
+        max_entries: int = 5000,
+    ):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        # key -> (text, total_tokens, created_at)
+        self._memory: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        key TEXT PRIMARY KEY,
+                        model TEXT,
+                        response TEXT,
+                        total_tokens INT,
+                        created_at REAL,
+                        last_used REAL
+                    )
+                """)
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt: str) -> str:
+        payload = f"{model}\x00{temperature:.3f}\x00{normalise_prompt(prompt)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT response, total_tokens, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1] or 0, row[2])
+            if entry is None or now - entry[2] > self.ttl_s:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.tokens_saved += entry[1]
+            self._remember(key, entry)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            return entry[0]
+
+    def put(self, key: str, model: str, response: str, total_tokens: int = 0) -> None:
+        now = time.time()
+        entry = (response, total_tokens, now)
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, model, response, total_tokens, now, now),
+                    )
+                    self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_s,))
+                    self._conn.execute(
+                        "DELETE FROM llm_cache WHERE key IN ("
+                        "SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "tokens_saved": self.tokens_saved,
+        }
+
+    def _remember(self, key: str, entry: Tuple[str, int, float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
@@ -6,51 +6,256 @@ local models, etc.) without touching UI/business logic.
 
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
 import openai
 import os
 from dotenv import load_dotenv
 
+from app.llm.llm_cache import LLMCache
+from app.llm.openai_scheduler import PRIORITY_INTERACTIVE, OpenAIScheduler, default_scheduler
+from app.metrics import add_tokens, propagate, traced
+
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+CHAT_MODEL = "gpt-3.5-turbo"
+SUMMARY_TEMPERATURE = 0.8
+JUDGE_TEMPERATURE = 0.7
+# Chunk digests should stay factual; creativity is left to the final (reduce) step.
+MAP_TEMPERATURE = 0.3
+
+# Rough heuristic (~4 characters per token) that is good enough for prompt budgeting.
+CHARS_PER_TOKEN = 4
+# Summary prompts above this size switch to map-reduce summarization.
+MAX_PROMPT_TOKENS = 3000
+# Upper bound on residents per map chunk; smaller chunks are used when needed to fit the budget.
+RESIDENTS_PER_CHUNK = 40
+# What the notes repository hands out per resident: the newest 3 notes of at most 100 characters.
+NOTES_PER_RESIDENT = 3
+MAX_NOTE_CHARS = 100
+MAP_WORKERS = 4
+# Completion size assumed when reserving tokens/min; corrected from the reported usage.
+EXPECTED_COMPLETION_TOKENS = 300
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
 
 class LLMService:
 
-    def generate_judge_verdict(self, prompt):
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
+    def __init__(
+        self,
+        model: str = CHAT_MODEL,
+        cache: Optional[LLMCache] = None,
+        max_prompt_tokens: int = MAX_PROMPT_TOKENS,
+        chunk_size: int = RESIDENTS_PER_CHUNK,
+        map_workers: int = MAP_WORKERS,
+        scheduler: Optional[OpenAIScheduler] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+    ):
+        self.model = model
+        # Identical prompts are answered from the cache instead of the provider.
+        self.cache = cache if cache is not None else LLMCache()
+        self.max_prompt_tokens = max_prompt_tokens
+        self.chunk_size = chunk_size
+        self.map_workers = map_workers
+        # Shared with every other OpenAI caller in the process so limits apply globally.
+        self.scheduler = scheduler if scheduler is not None else default_scheduler()
+        self.priority = priority
+
+    @traced("llm.chat")
+    def _complete(self, prompt, temperature, refresh=False):
+        """Chat completion with caching; `refresh=True` skips the lookup and overwrites the entry."""
+        key = self.cache.make_key(self.model, temperature, prompt)
+        if not refresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = self.scheduler.submit(
+            lambda: openai.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature
+            ),
+            tokens=estimate_tokens(prompt) + EXPECTED_COMPLETION_TOKENS,
+            priority=self.priority,
+            key=key,
         )
-        return response.choices[0].message.content.strip()
+        text = response.choices[0].message.content.strip()
+        usage = getattr(response, "usage", None)
+        total_tokens = getattr(usage, "total_tokens", 0) or 0
+        add_tokens("llm.chat", total_tokens)
+        self.cache.put(key, self.model, text, total_tokens)
+        return text
+
+    @traced("llm.chat_stream")
+    def _stream(self, prompt, temperature, refresh=False) -> Iterator[str]:
+        """Streaming counterpart of `_complete`: yields text deltas as they arrive.
 
-    def generate_location_summary(self, location, residents):
-        prompt = f"""
+        A cached answer is yielded in one piece; a fresh one is cached once the stream ends.
+        """
+        key = self.cache.make_key(self.model, temperature, prompt)
+        if not refresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        # Only opening the stream is scheduled (and retried); deltas are read outside the scheduler.
+        stream = self.scheduler.submit(
+            lambda: openai.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True}
+            ),
+            tokens=estimate_tokens(prompt) + EXPECTED_COMPLETION_TOKENS,
+            priority=self.priority,
+        )
+        parts = []
+        total_tokens = 0
+        for chunk in stream:
+            # With include_usage, the final chunk has usage and no choices.
+            if getattr(chunk, "usage", None):
+                total_tokens = chunk.usage.total_tokens or 0
+            if chunk.choices and chunk.choices[0].delta.content:
+                delta = chunk.choices[0].delta.content
+                parts.append(delta)
+                yield delta
+        add_tokens("llm.chat_stream", total_tokens)
+        self.cache.put(key, self.model, "".join(parts).strip(), total_tokens)
+
+    @traced("llm.judge")
+    def generate_judge_verdict(self, prompt, refresh=False):
+        return self._complete(prompt, JUDGE_TEMPERATURE, refresh=refresh)
+
+    def stream_judge_verdict(self, prompt, refresh=False) -> Iterator[str]:
+        return self._stream(prompt, JUDGE_TEMPERATURE, refresh=refresh)
+
+    def build_judge_prompt(self, location, residents, summary):
+        # Source context for the judge: location, residents, and notes
+        source_context = f"Location: {location['name']}\nType: {location.get('type', '-')}, Dimension: {location.get('dimension', '-')}\n"
+        for r in residents:
+            c = r["character"]
+            notes = r["notes"]
+            source_context += f"\nResident: {c.get('name', '-')}, Status: {c.get('status', '-')}, Species: {c.get('species', '-')}, Gender: {c.get('gender', '-')}, Origin: {(c.get('origin') or {}).get('name', '-')}, Current location: {(c.get('location') or {}).get('name', '-')}, Episodes: {len(c.get('episode') or [])}"
+            if notes:
+                source_context += f"\n  Notes: {'; '.join(notes)}"
+
+        return f"""
+You are an expert judge for Rick & Morty summaries. Here is the source information about a location and its residents, and an AI-generated summary.\n\nSOURCE:\n{source_context}\n\nAI SUMMARY:\n{summary}\n\nYour task:\n- Give a Factual score (1-5) for how factually accurate the summary is compared to the source.\n- Give a Creativity score (1-5) for how creative or entertaining the summary is.\n- Give a Completeness score (1-5) for how well the summary covers the important details from the source.\n- Then, provide a 1-2 sentence verdict on the summary's overall quality.\n\nRespond in this JSON format:\n{{\n  \"factual\": <int>,\n  \"creativity\": <int>,\n  \"completeness\": <int>,\n  \"verdict\": <string>\n}}"""
+
+    @staticmethod
+    def _location_header(location, residents):
+        return f"""
 You are a Rick & Morty narrator.
 
 Location Name: {location['name']}
 Type: {location['type']}
 Dimension: {location['dimension']}
 Number of residents: {len(residents)}
-
-Residents:
 """
+
+    @staticmethod
+    def _resident_lines(residents):
+        lines = ""
         for r in residents:
             c = r["character"]
             notes = r["notes"]
-            prompt += (
+            lines += (
                 f"\n- Name: {c.get('name', '—')}, Status: {c.get('status', '—')}, Species: {c.get('species', '—')}, "
                 f"Gender: {c.get('gender', '—')}, Origin: {(c.get('origin') or {}).get('name', '—')}, "
                 f"Current location: {(c.get('location') or {}).get('name', '—')}, Episodes: {len(c.get('episode') or [])}"
             )
             if notes:
-                prompt += f"\n  Top notes: " + "; ".join(notes)
+                lines += f"\n  Top notes: " + "; ".join(notes)
+        return lines
+
+    def build_location_prompt(self, location, residents):
+        prompt = self._location_header(location, residents) + "\nResidents:\n"
+        prompt += self._resident_lines(residents)
         prompt += "\n\nGenerate a humorous but informative summary."
+        return prompt
+
+    def chunk_residents(self, location, residents) -> List[list]:
+        """Split residents, in character-ID order, into chunks whose map prompt fits the budget.
+
+        The chunk size assumes every resident carries a full set of maximum-length
+        notes, so boundaries depend only on which residents live here, not on their
+        notes: a note change only alters (and re-summarizes) the chunk that resident is in.
+        """
+        ordered = sorted(residents, key=lambda r: r["character"].get("id", 0))
+        if not ordered:
+            return []
+        worst_notes = ["x" * MAX_NOTE_CHARS] * NOTES_PER_RESIDENT
+        per_resident = max(
+            estimate_tokens(self._resident_lines([{"character": r["character"], "notes": worst_notes}]))
+            for r in ordered
+        )
+        room = self.max_prompt_tokens - estimate_tokens(self._chunk_prompt(location, []))
+        size = max(1, min(self.chunk_size, room // per_resident))
+        return [ordered[i:i + size] for i in range(0, len(ordered), size)]
 
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.8
+    @classmethod
+    def _chunk_prompt(cls, location, chunk):
+        return (
+            f"You are summarizing some of the residents of {location['name']} in the Rick & Morty universe.\n"
+            f"Residents:\n{cls._resident_lines(chunk)}\n\n"
+            "In at most 5 sentences, capture who these residents are: notable names, species, "
+            "statuses and anything interesting from their notes. Be factual."
         )
-        return response.choices[0].message.content.strip()
+
+    def _summarize_chunk(self, location, chunk, refresh=False):
+        return self._complete(self._chunk_prompt(location, chunk), MAP_TEMPERATURE, refresh=refresh)
+
+    def _reduce_prompt(self, location, residents, digests):
+        prompt = self._location_header(location, residents) + "\nSummaries of resident groups:\n"
+        prompt += "\n".join(f"- {d}" for d in digests)
+        prompt += "\n\nUsing these, generate a humorous but informative summary of the location."
+        return prompt
+
+    @traced("llm.summary_prompt")
+    def build_summary_prompt(self, location, residents, refresh=False, mode="auto"):
+        """Final summary prompt, running the map phase first if the location is too big.
+
+        `mode` is "auto" (map-reduce only above `max_prompt_tokens`), "single" or "map_reduce".
+        Per-chunk summaries go through the response cache, so unchanged chunks are reused.
+        """
+        prompt = self.build_location_prompt(location, residents)
+        if mode == "single" or (mode == "auto" and estimate_tokens(prompt) <= self.max_prompt_tokens):
+            return prompt
+
+        chunks = self.chunk_residents(location, residents)
+        with ThreadPoolExecutor(max_workers=self.map_workers) as pool:
+            digests = list(pool.map(propagate(lambda chunk: self._summarize_chunk(location, chunk, refresh)), chunks))
+        # If there are so many chunks that their digests overflow the budget, fold them again.
+        while len(digests) > 1 and estimate_tokens(self._reduce_prompt(location, residents, digests)) > self.max_prompt_tokens:
+            groups = [digests[i:i + self.chunk_size] for i in range(0, len(digests), self.chunk_size)]
+            if len(groups) == len(digests):
+                break
+            with ThreadPoolExecutor(max_workers=self.map_workers) as pool:
+                digests = list(pool.map(
+                    propagate(lambda group: self._complete(
+                        "Condense these Rick & Morty resident summaries into one factual paragraph:\n"
+                        + "\n".join(f"- {d}" for d in group),
+                        MAP_TEMPERATURE, refresh=refresh,
+                    )),
+                    groups,
+                ))
+        return self._reduce_prompt(location, residents, digests)
+
+    @traced("llm.summary")
+    def generate_location_summary(self, location, residents, refresh=False, mode="auto"):
+        prompt = self.build_summary_prompt(location, residents, refresh=refresh, mode=mode)
+        return self._complete(prompt, SUMMARY_TEMPERATURE, refresh=refresh)
+
+    def stream_location_summary(self, location, residents, refresh=False, mode="auto") -> Iterator[str]:
+        # For large locations the map phase runs up front; only the reduce step streams.
+        prompt = self.build_summary_prompt(location, residents, refresh=refresh, mode=mode)
+        return self._stream(prompt, SUMMARY_TEMPERATURE, refresh=refresh)
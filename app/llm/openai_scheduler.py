@@ -0,0 +1,260 @@
+"""Shared, rate-limit-aware scheduler for OpenAI requests.
+
+Every chat and embeddings call from `LLMService` / `EmbeddingService` goes
+through one process-wide `OpenAIScheduler`, which:
+
+- admits requests under token-bucket limits for requests/min and tokens/min,
+  plus a cap on requests in flight;
+- serves waiting requests by priority lane, so interactive UI calls jump
+  ahead of queued batch work, and batch work leaves headroom in the buckets;
+- retries 429s, 5xx and connection errors with jittered exponential backoff
+  (honouring Retry-After), pausing every lane while the provider is throttling;
+- coalesces identical in-flight requests into a single call.
+
+Limits default to `OPENAI_REQUESTS_PER_MIN` / `OPENAI_TOKENS_PER_MIN` from the
+environment. Priorities only order requests within one process.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+import openai
+
+from app.metrics import current_metrics
+
+T = TypeVar("T")
+
+# Retries are handled here; the SDK's own retry loop would bypass the buckets.
+openai.max_retries = 0
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+DEFAULT_REQUESTS_PER_MIN = 500
+DEFAULT_TOKENS_PER_MIN = 200_000
+DEFAULT_MAX_IN_FLIGHT = 8
+# Share of each bucket that batch requests may not use, kept free for interactive calls.
+BATCH_HEADROOM = 0.2
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 30.0
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most `per_minute` units."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate_per_s = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` of capacity untouched."""
+        self._refill()
+        # Anything that can't fit (a request larger than the bucket, or one that only
+        # fails because of the reserve) is let through once the bucket is full.
+        needed = min(min(amount, self.capacity) + reserve * self.capacity, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate_per_s
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Correct an earlier estimate (may leave the bucket in debt)."""
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in RETRY_STATUSES
+
+
+def retry_after_s(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _total_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+class OpenAIScheduler:
+
+    def __init__(
+        self,
+        requests_per_min: float = DEFAULT_REQUESTS_PER_MIN,
+        tokens_per_min: float = DEFAULT_TOKENS_PER_MIN,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff_base_s: float = BACKOFF_BASE_S,
+        backoff_max_s: float = BACKOFF_MAX_S,
+        batch_headroom: float = BATCH_HEADROOM,
+    ):
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min)
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.batch_headroom = batch_headroom
+        self._cond = threading.Condition()
+        self._queue: list = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._pending: Dict[Hashable, Future] = {}
+        self.stats = {"requests": 0, "retries": 0, "coalesced": 0, "throttled": 0}
+
+    def submit(
+        self,
+        call: Callable[[], T],
+        tokens: int = 0,
+        priority: int = PRIORITY_INTERACTIVE,
+        key: Optional[Hashable] = None,
+    ) -> T:
+        """Run `call` once it is admitted, retrying transient failures.
+
+        `tokens` is the estimated token cost; if the result reports usage, the
+        token bucket is corrected afterwards. Callers passing the same `key`
+        while a request is in flight share its result instead of sending another.
+        """
+        if key is None:
+            return self._run(call, tokens, priority)
+
+        with self._cond:
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not owner:
+            return pending.result()
+        try:
+            result = self._run(call, tokens, priority)
+            pending.set_result(result)
+            return result
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._cond:
+                del self._pending[key]
+
+    def _run(self, call: Callable[[], T], tokens: int, priority: int) -> T:
+        for attempt in range(self.max_attempts):
+            self._acquire(tokens, priority)
+            try:
+                result = call()
+            except Exception as e:
+                error: Optional[Exception] = e
+            else:
+                error = None
+            finally:
+                # Free the slot before any backoff sleep so other requests can proceed.
+                self._release()
+
+            if error is None:
+                actual = _total_tokens(result)
+                if actual is not None and tokens:
+                    with self._cond:
+                        self.tokens.adjust(actual - tokens)
+                return result
+            if attempt + 1 >= self.max_attempts or not is_retryable(error):
+                raise error
+            delay = self._backoff(attempt, retry_after_s(error))
+            self._note_retry(delay, throttled=getattr(error, "status_code", None) == 429)
+            current_metrics().record("openai.retry", delay, error=True)
+            time.sleep(delay)
+        raise RuntimeError("unreachable")  # the last attempt always returns or raises
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter keeps concurrent callers from retrying in lockstep.
+        delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)))
+        return max(delay, retry_after or 0.0)
+
+    def _note_retry(self, delay: float, throttled: bool) -> None:
+        with self._cond:
+            self.stats["retries"] += 1
+            if throttled:
+                # The provider said slow down: hold every lane, not just the failed request.
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self.stats["throttled"] += 1
+
+    def _acquire(self, tokens: int, priority: int) -> None:
+        started = time.monotonic()
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            while True:
+                wait = self._wait_time(ticket, tokens)
+                if wait == 0.0:
+                    break
+                self._cond.wait(timeout=wait)
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self._in_flight += 1
+            self.stats["requests"] += 1
+            # The next ticket in line may be admissible now.
+            self._cond.notify_all()
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            current_metrics().record("openai.queue", waited)
+
+    def _wait_time(self, ticket, tokens: int) -> Optional[float]:
+        """0.0 if `ticket` may go now, else how long to wait (None: until notified)."""
+        if self._queue[0] != ticket or self._in_flight >= self.max_in_flight:
+            return None
+        paused = self._paused_until - time.monotonic()
+        if paused > 0:
+            return paused
+        reserve = self.batch_headroom if ticket[0] > PRIORITY_INTERACTIVE else 0.0
+        return max(self.requests.wait_time(1, reserve), self.tokens.wait_time(tokens, reserve))
+
+    def _release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+
+_default: Optional[OpenAIScheduler] = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> OpenAIScheduler:
+    """The process-wide scheduler shared by every LLM and embedding service."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = OpenAIScheduler(
+                requests_per_min=float(os.getenv("OPENAI_REQUESTS_PER_MIN", DEFAULT_REQUESTS_PER_MIN)),
+                tokens_per_min=float(os.getenv("OPENAI_TOKENS_PER_MIN", DEFAULT_TOKENS_PER_MIN)),
+            )
+        return _default
@@ -0,0 +1,219 @@
+"""Per-stage call accounting for the API client, LLM, embeddings and notes DB.
+
+Instrumented methods are decorated with `@traced("stage")`, which records call
+count, errors and wall time; code inside a stage can add the bytes or tokens it
+moved with `add_bytes` / `add_tokens`. Records go to the collector installed
+with `collect()` (one per Streamlit rerun or batch run), or to
+`GLOBAL_METRICS` when none is installed.
+
+Collectors are tracked with a context variable, so work handed to a thread pool
+must be wrapped with `propagate(fn)` to be attributed to the caller's collector.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import json
+import pstats
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+METRIC_PREFIX = "rick_morty"
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    errors: int = 0
+    total_s: float = 0.0
+    max_s: float = 0.0
+    bytes: int = 0
+    tokens: int = 0
+
+
+class Metrics:
+    """Thread-safe map of stage name -> `StageStats`."""
+
+    def __init__(self) -> None:
+        self._stages: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, duration_s: float, error: bool = False) -> None:
+        with self._lock:
+            stats = self._stages.setdefault(stage, StageStats())
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.total_s += duration_s
+            stats.max_s = max(stats.max_s, duration_s)
+
+    def add(self, stage: str, bytes: int = 0, tokens: int = 0) -> None:
+        with self._lock:
+            stats = self._stages.setdefault(stage, StageStats())
+            stats.bytes += bytes
+            stats.tokens += tokens
+
+    def stages(self) -> Dict[str, StageStats]:
+        with self._lock:
+            return {name: StageStats(**asdict(stats)) for name, stats in sorted(self._stages.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {**asdict(stats), "total_s": round(stats.total_s, 4), "max_s": round(stats.max_s, 4)}
+            for name, stats in self.stages().items()
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = METRIC_PREFIX) -> str:
+        """Prometheus text exposition format, one series per stage."""
+        series = [
+            ("calls_total", "counter", "Calls per stage.", "calls"),
+            ("errors_total", "counter", "Calls per stage that raised.", "errors"),
+            ("seconds_total", "counter", "Wall time spent per stage.", "total_s"),
+            ("seconds_max", "gauge", "Slowest single call per stage.", "max_s"),
+            ("bytes_total", "counter", "Response bytes received per stage.", "bytes"),
+            ("tokens_total", "counter", "LLM / embedding tokens used per stage.", "tokens"),
+        ]
+        stages = self.stages()
+        lines = []
+        for suffix, kind, help_text, field in series:
+            name = f"{prefix}_stage_{suffix}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, stats in stages.items():
+                lines.append(f'{name}{{stage="{stage}"}} {getattr(stats, field):g}')
+        return "\n".join(lines) + "\n"
+
+
+GLOBAL_METRICS = Metrics()
+_current: contextvars.ContextVar[Optional[Metrics]] = contextvars.ContextVar("rick_morty_metrics", default=None)
+
+
+def current_metrics() -> Metrics:
+    return _current.get() or GLOBAL_METRICS
+
+
+@contextlib.contextmanager
+def collect(metrics: Optional[Metrics] = None) -> Iterator[Metrics]:
+    """Send everything recorded in this context to `metrics` (a fresh collector by default)."""
+    metrics = metrics if metrics is not None else Metrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def add_bytes(stage: str, n: int) -> None:
+    current_metrics().add(stage, bytes=n)
+
+
+def add_tokens(stage: str, n: int) -> None:
+    current_metrics().add(stage, tokens=n)
+
+
+def propagate(fn: F) -> F:
+    """Bind `fn` to the caller's collector so it can run on another thread.
+
+    Each call runs in its own copy of the captured context, so the wrapper is
+    safe to use with `pool.map` and concurrent `submit`s.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper  # type: ignore[return-value]
+
+
+def traced(stage: str) -> Callable[[F], F]:
+    """Record calls to the decorated function under `stage`.
+
+    Works for plain functions, generators (timed until exhausted or closed) and
+    coroutines.
+    """
+    def decorator(fn: F) -> F:
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                metrics = current_metrics()
+                started = time.perf_counter()
+                error = False
+                try:
+                    yield from fn(*args, **kwargs)
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    metrics.record(stage, time.perf_counter() - started, error)
+            return gen_wrapper  # type: ignore[return-value]
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                metrics = current_metrics()
+                started = time.perf_counter()
+                error = False
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    metrics.record(stage, time.perf_counter() - started, error)
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            metrics = current_metrics()
+            started = time.perf_counter()
+            error = False
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                metrics.record(stage, time.perf_counter() - started, error)
+        return wrapper  # type: ignore[return-value]
+    return decorator
+
+
+@contextlib.contextmanager
+def profiled(enabled: bool = True, output: Optional[str] = None) -> Iterator[Optional[cProfile.Profile]]:
+    """Opt-in cProfile around a block; stats are dumped to `output` if given.
+
+    Only the calling thread is profiled; work on thread pools shows up as time
+    spent waiting on futures.
+    """
+    if not enabled:
+        yield None
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        if output:
+            profile.dump_stats(output)
+
+
+def profile_summary(profile: cProfile.Profile, limit: int = 30, sort: str = "cumulative") -> str:
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -1,26 +1,48 @@
 """SQLite notes repository (placeholder).
 
 Uses the DB file at rick_morty_ai/db/notes.db.
+
+A single long-lived connection (WAL mode) is shared by all calls; access is
+serialised with a lock so the repository can be used from worker threads.
+An FTS5 table mirrors the notes (kept in sync by triggers) for keyword search.
 """
 
 from __future__ import annotations
 
+import re
 import sqlite3
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.metrics import traced
 
 DB_PATH = "db/notes.db"
 
 
 class NotesRepository:
 
-    def __init__(self):
+    def __init__(self, db_path: str = DB_PATH):
+        # Callbacks invoked with a character_id whenever that character's notes change.
+        self._listeners = []
+        self._lock = threading.Lock()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
         self._create_table()
 
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, character_id):
+        for callback in self._listeners:
+            callback(character_id)
+
     def _create_table(self):
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.execute("""
+        with self._lock, self._conn:
+            self._conn.execute("""
                 CREATE TABLE IF NOT EXISTS character_notes (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     character_id INT,
@@ -28,21 +50,130 @@ class NotesRepository:
                     created_at TEXT
                 )
             """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_character_notes_character "
+                "ON character_notes (character_id, id DESC)"
+            )
+            fts_exists = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'character_notes_fts'"
+            ).fetchone()
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS character_notes_fts
+                USING fts5(note, content='character_notes', content_rowid='id', tokenize='porter unicode61')
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS character_notes_ai AFTER INSERT ON character_notes BEGIN
+                    INSERT INTO character_notes_fts(rowid, note) VALUES (new.id, new.note);
+                END
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS character_notes_ad AFTER DELETE ON character_notes BEGIN
+                    INSERT INTO character_notes_fts(character_notes_fts, rowid, note) VALUES ('delete', old.id, old.note);
+                END
+            """)
+            self._conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS character_notes_au AFTER UPDATE ON character_notes BEGIN
+                    INSERT INTO character_notes_fts(character_notes_fts, rowid, note) VALUES ('delete', old.id, old.note);
+                    INSERT INTO character_notes_fts(rowid, note) VALUES (new.id, new.note);
+                END
+            """)
+            if not fts_exists:
+                # Index notes written before the FTS table existed.
+                self._conn.execute("INSERT INTO character_notes_fts(character_notes_fts) VALUES ('rebuild')")
 
     def add_note(self, character_id, note):
-        note = (note or "").strip()[:100]
-        if not note:
+        self.add_notes([(character_id, note)])
+
+    @traced("db.notes.add")
+    def add_notes(self, items: Iterable[Tuple[int, str]]):
+        """Insert many `(character_id, note)` pairs in one transaction (e.g. imports)."""
+        now = datetime.utcnow().isoformat()
+        rows = []
+        for character_id, note in items:
+            note = (note or "").strip()[:100]
+            if note:
+                rows.append((character_id, note, now))
+        if not rows:
             return
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.execute(
-                "INSERT INTO character_notes VALUES (NULL, ?, ?, ?)",
-                (character_id, note, datetime.utcnow().isoformat())
-            )
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO character_notes VALUES (NULL, ?, ?, ?)", rows)
+        for character_id in dict.fromkeys(r[0] for r in rows):
+            self._notify(character_id)
 
+    @traced("db.notes.get")
     def get_notes(self, character_id, limit: int = 3):
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.execute(
+        with self._lock:
+            cursor = self._conn.execute(
                 "SELECT note, created_at FROM character_notes WHERE character_id = ? ORDER BY id DESC LIMIT ?",
                 (character_id, limit)
             )
             return cursor.fetchall()
+
+    @traced("db.notes.get_bulk")
+    def get_notes_for_characters(self, character_ids: Iterable[int], limit: int = 3) -> Dict[int, List[Tuple[str, str]]]:
+        """Newest `limit` notes for each character, fetched in a single query.
+
+        Every requested ID is present in the result, mapped to an empty list if it has no notes.
+        """
+        ids = list(dict.fromkeys(character_ids))
+        notes: Dict[int, List[Tuple[str, str]]] = {i: [] for i in ids}
+        if not ids:
+            return notes
+        # json_each sidesteps SQLite's bound-parameter limit for large locations.
+        id_list = "[" + ",".join(str(int(i)) for i in ids) + "]"
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                SELECT character_id, note, created_at FROM (
+                    SELECT character_id, note, created_at,
+                           ROW_NUMBER() OVER (PARTITION BY character_id ORDER BY id DESC) AS rn
+                    FROM character_notes
+                    WHERE character_id IN (SELECT value FROM json_each(?))
+                )
+                WHERE rn <= ?
+                ORDER BY character_id, rn
+                """,
+                (id_list, limit)
+            )
+            for character_id, note, created_at in cursor:
+                notes[character_id].append((note, created_at))
+        return notes
+
+    @traced("db.notes.search")
+    def search_notes(self, query: str, limit: Optional[int] = 20,
+                     character_ids: Optional[Iterable[int]] = None) -> List[int]:
+        """Character IDs whose notes match any word of `query`, best BM25 match first.
+
+        `character_ids` restricts the search before `limit` is applied, so a scoped
+        search isn't crowded out by better matches elsewhere. `limit=None` returns
+        every match.
+        """
+        terms = re.findall(r"\w+", query or "")
+        if not terms:
+            return []
+        # Quote each term so user input can't be parsed as FTS5 query syntax.
+        match = " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+        params: list = [match]
+        scope = ""
+        if character_ids is not None:
+            scope = "WHERE n.character_id IN (SELECT value FROM json_each(?))"
+            params.append("[" + ",".join(str(int(i)) for i in dict.fromkeys(character_ids)) + "]")
+        params.append(-1 if limit is None else limit)  # SQLite treats a negative LIMIT as none
+        with self._lock:
+            cursor = self._conn.execute(
+                f"""
+                SELECT n.character_id, MIN(hits.score) AS best
+                FROM (
+                    SELECT rowid, rank AS score
+                    FROM character_notes_fts
+                    WHERE character_notes_fts MATCH ?
+                ) AS hits
+                JOIN character_notes n ON n.id = hits.rowid
+                {scope}
+                GROUP BY n.character_id
+                ORDER BY best, n.character_id
+                LIMIT ?
+                """,
+                params
+            )
+            return [row[0] for row in cursor]
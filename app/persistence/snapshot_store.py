@@ -0,0 +1,135 @@
+"""Local SQLite snapshot of the public Rick & Morty data.
+
+Holds every character, location and episode (filled by `app/sync_snapshot.py`)
+so the client and UI can run without the public API. Records are stored as
+JSON keyed by ID; a few character fields are also stored as indexed columns for
+cross-location queries.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+SNAPSHOT_PATH = "db/snapshot.db"
+RESOURCES = ("character", "location", "episode")
+
+
+class SnapshotStore:
+
+    def __init__(self, db_path: str = SNAPSHOT_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    @staticmethod
+    def exists(db_path: str = SNAPSHOT_PATH) -> bool:
+        return Path(db_path).exists()
+
+    def _create_tables(self):
+        with self._lock, self._conn:
+            for resource in RESOURCES:
+                self._conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {resource} (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT,
+                        data TEXT
+                    )
+                """)
+            # Denormalised columns for filtering characters across every location.
+            for column in ("status", "species", "location_name"):
+                try:
+                    self._conn.execute(f"ALTER TABLE character ADD COLUMN {column} TEXT")
+                except sqlite3.OperationalError:
+                    pass  # column already exists
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_character_status_species ON character (status, species)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_character_location ON character (location_name)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    resource TEXT PRIMARY KEY,
+                    synced_at REAL
+                )
+            """)
+
+    def upsert(self, resource: str, items: Iterable[Dict[str, Any]]) -> int:
+        self._check(resource)
+        items = list(items)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {resource} (id, name, data) VALUES (?, ?, ?)",
+                [(item["id"], item.get("name"), json.dumps(item)) for item in items],
+            )
+            if resource == "character":
+                self._conn.executemany(
+                    "UPDATE character SET status = ?, species = ?, location_name = ? WHERE id = ?",
+                    [
+                        (c.get("status"), c.get("species"), (c.get("location") or {}).get("name"), c["id"])
+                        for c in items
+                    ],
+                )
+        return len(items)
+
+    def mark_synced(self, resource: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (resource, time.time()))
+
+    def last_synced(self, resource: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT synced_at FROM sync_state WHERE resource = ?", (resource,)).fetchone()
+        return row[0] if row else None
+
+    def count(self, resource: str) -> int:
+        self._check(resource)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {resource}").fetchone()[0]
+
+    def max_id(self, resource: str) -> int:
+        self._check(resource)
+        with self._lock:
+            return self._conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {resource}").fetchone()[0]
+
+    def has(self, resource: str) -> bool:
+        """True once `resource` has been fully synced at least once."""
+        return self.last_synced(resource) is not None
+
+    def get_all(self, resource: str) -> List[Dict[str, Any]]:
+        self._check(resource)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT data FROM {resource} ORDER BY id").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get_many(self, resource: str, ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Records for whichever of `ids` are in the snapshot, keyed by ID."""
+        self._check(resource)
+        id_list = "[" + ",".join(str(int(i)) for i in dict.fromkeys(ids)) + "]"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, data FROM {resource} WHERE id IN (SELECT value FROM json_each(?))", (id_list,)
+            ).fetchall()
+        return {r[0]: json.loads(r[1]) for r in rows}
+
+    def query_characters(self, status: Optional[str] = None, species: Optional[str] = None,
+                         location: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Characters across all locations matching the given fields (case-insensitive)."""
+        clauses, params = [], []
+        for column, value in (("status", status), ("species", species), ("location_name", location)):
+            if value:
+                clauses.append(f"{column} = ? COLLATE NOCASE")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT data FROM character {where} ORDER BY id", params).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    @staticmethod
+    def _check(resource: str) -> None:
+        # Table names can't be bound as parameters, so only known resources are allowed.
+        if resource not in RESOURCES:
+            raise ValueError(f"Unknown resource: {resource}")
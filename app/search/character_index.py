@@ -0,0 +1,240 @@
+"""Semantic search index over characters (details + notes).
+
+Wraps a `VectorIndex` whose rows are characters, keyed by character ID. It can
+hold a single location's residents or the whole universe; scoping to a location
+is just an ID filter at query time.
+
+When a note is added, only that character's row is marked dirty; it is
+re-embedded lazily on the next search instead of rebuilding the whole index.
+
+Searches can fuse the semantic ranking with the notes full-text ranking
+(reciprocal rank fusion), or use the full-text ranking alone, which needs no
+embedding request at all: matches without a row yet are described from their
+character records instead.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.llm.embeddings import EmbeddingService
+from app.persistence.notes_repository import NotesRepository
+from app.search.vector_index import VectorIndex, matches_filters
+
+INDEX_PATH = "db/character_index"
+DIRTY_FILE = "dirty.json"
+
+# Standard RRF damping constant; larger values flatten the contribution of top ranks.
+RRF_K = 60
+# How many lexical / semantic candidates feed the fusion step.
+FUSION_CANDIDATES = 50
+
+
+def character_metadata(character: Dict[str, Any]) -> Dict[str, Any]:
+    """The subset of a character record kept alongside its vector (and used for filters)."""
+    return {
+        "id": character["id"],
+        "name": character.get("name", "-"),
+        "status": character.get("status", "-"),
+        "species": character.get("species", "-"),
+        "gender": character.get("gender", "-"),
+        "origin": (character.get("origin") or {}).get("name", "-"),
+        "location": (character.get("location") or {}).get("name", "-"),
+        "episodes": len(character.get("episode") or []),
+        "image": character.get("image"),
+    }
+
+
+def character_document(meta: Dict[str, Any], notes: List[str]) -> str:
+    """Text that gets embedded for a character: its details followed by its notes."""
+    return (
+        f"Name: {meta['name']}; Status: {meta['status']}; Species: {meta['species']}; "
+        f"Gender: {meta['gender']}; Origin: {meta['origin']}; Current location: {meta['location']}; "
+        f"Episodes: {meta['episodes']}; Notes: {'; '.join(notes)}"
+    )
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Merge several best-first ID rankings; ties break on ID so results are reproducible."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+class CharacterIndex:
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        notes_repo: NotesRepository,
+        path: Optional[str] = INDEX_PATH,
+    ):
+        self.embedding_service = embedding_service
+        self.notes_repo = notes_repo
+        self.path = path
+        self.index = VectorIndex.load(path) if path and VectorIndex.exists(path) else VectorIndex()
+        self._lock = threading.Lock()
+        self._dirty = self._load_dirty()
+        # Bumped by every note change; `_marked_at` keeps the value at each character's latest one.
+        self._generation = 0
+        self._marked_at: Dict[int, int] = {}
+        notes_repo.add_listener(self.mark_dirty)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, character_id: int) -> bool:
+        return character_id in self.index
+
+    def add(self, characters: Iterable[Dict[str, Any]]) -> None:
+        """(Re-)embed the given characters and upsert their rows."""
+        self._embed([character_metadata(c) for c in characters])
+
+    def _embed(self, metas: List[Dict[str, Any]]) -> None:
+        if not metas:
+            return
+        with self._lock:
+            started = self._generation
+        notes_by_id = self.notes_repo.get_notes_for_characters([m["id"] for m in metas])
+        for meta in metas:
+            meta["document"] = character_document(meta, [n for n, _ in notes_by_id[meta["id"]]])
+        vectors = self.embedding_service.embed_many([m["document"] for m in metas])
+        with self._lock:
+            # Rows whose notes changed after they were read are stale: skip them, and keep
+            # them dirty so the next refresh re-reads their notes.
+            current = [row for row, meta in enumerate(metas) if self._marked_at.get(meta["id"], 0) <= started]
+            self.index.upsert([metas[row]["id"] for row in current], vectors[current], [metas[row] for row in current])
+            self._dirty.difference_update(metas[row]["id"] for row in current)
+            self.save()
+
+    def mark_dirty(self, character_id: int) -> None:
+        """Flag a character whose notes changed; its row is rebuilt on the next search."""
+        with self._lock:
+            # Recorded even for unindexed characters, which may be mid-embed right now.
+            self._generation += 1
+            self._marked_at[character_id] = self._generation
+            if character_id not in self.index:
+                return
+            self._dirty.add(character_id)
+            self._save_dirty()
+
+    def refresh(self) -> None:
+        """Re-embed dirty rows from their stored metadata; clean rows are untouched."""
+        with self._lock:
+            metas = [dict(self.index.get_metadata(i)) for i in self._dirty if i in self.index]
+        self._embed(metas)
+
+    def ensure(self, characters: Iterable[Dict[str, Any]]) -> None:
+        """Add any of `characters` that are not indexed yet."""
+        self.add([c for c in characters if c["id"] not in self.index])
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[Iterable[int]] = None,
+        min_score: Optional[float] = None,
+        hybrid: bool = True,
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Top-k `(metadata, score)` pairs; `metadata["document"]` is the embedded text.
+
+        With `hybrid=True` the semantic ranking is fused with the notes full-text
+        ranking and the score is the fused RRF score. `min_score` still applies to
+        the cosine similarity, but keyword hits are always kept.
+        """
+        if self._dirty:
+            self.refresh()
+        query_vec = self.embedding_service.embed(query)
+        if not hybrid:
+            with self._lock:
+                hits = self.index.search(query_vec, k=k, where=where, ids=ids, min_score=min_score)
+                return [(self.index.get_metadata(i), score) for i, score in hits]
+
+        lexical = [m["id"] for m in self._keyword_matches(query, FUSION_CANDIDATES, where, ids)]
+        with self._lock:
+            semantic = self.index.search(query_vec, k=max(k, FUSION_CANDIDATES), where=where, ids=ids)
+            cosine = dict(semantic)
+            keyword_hits = set(lexical)
+            fused = [
+                (item_id, score)
+                for item_id, score in reciprocal_rank_fusion([[i for i, _ in semantic], lexical])
+                if item_id in keyword_hits or min_score is None or cosine.get(item_id, -1.0) >= min_score
+            ]
+            return [(self.index.get_metadata(i), score) for i, score in fused[:k]]
+
+    def keyword_search(
+        self,
+        query: str,
+        k: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[Iterable[int]] = None,
+        fetch_characters: Optional[Callable[[List[int]], List[Dict[str, Any]]]] = None,
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Top-k characters whose notes match `query`, ranked by BM25; no embedding call.
+
+        Returns `(metadata, score)` pairs like `search`, with a reciprocal-rank
+        score. Matches that aren't indexed yet are resolved with `fetch_characters`
+        (IDs -> character records, e.g. `client.get_by_ids`), so the index doesn't
+        need to be built first; without it they are skipped.
+        """
+        metas = self._keyword_matches(query, k, where, ids, fetch_characters)
+        unindexed = [m["id"] for m in metas if "document" not in m]
+        notes_by_id = self.notes_repo.get_notes_for_characters(unindexed) if unindexed else {}
+        for meta in metas:
+            if meta["id"] in notes_by_id:
+                meta["document"] = character_document(meta, [n for n, _ in notes_by_id[meta["id"]]])
+        return [(meta, 1.0 / rank) for rank, meta in enumerate(metas, start=1)]
+
+    def _keyword_matches(
+        self,
+        query: str,
+        k: int,
+        where: Optional[Dict[str, Any]],
+        ids: Optional[Iterable[int]],
+        fetch_characters: Optional[Callable[[List[int]], List[Dict[str, Any]]]] = None,
+    ) -> List[Dict[str, Any]]:
+        # The ID scope is applied in SQL. `where` needs each match's metadata, so every
+        # scoped match is fetched and the cut to `k` comes after filtering.
+        candidates = self.notes_repo.search_notes(
+            query, limit=None, character_ids=None if ids is None else list(ids)
+        )
+        with self._lock:
+            metas = {i: self.index.get_metadata(i) for i in candidates}
+        unindexed = [i for i, meta in metas.items() if meta is None]
+        if unindexed and fetch_characters is not None:
+            metas.update((c["id"], character_metadata(c)) for c in fetch_characters(unindexed))
+        results: List[Dict[str, Any]] = []
+        for character_id in candidates:
+            meta = metas.get(character_id)
+            if meta is None or (where and not matches_filters(meta, where)):
+                continue
+            results.append(meta)
+            if len(results) >= k:
+                break
+        return results
+
+    def save(self) -> None:
+        if self.path:
+            self.index.save(self.path)
+            self._save_dirty()
+
+    def _load_dirty(self) -> set:
+        dirty_path = Path(self.path or "") / DIRTY_FILE
+        if not self.path or not dirty_path.exists():
+            return set()
+        with open(dirty_path, encoding="utf-8") as f:
+            return set(json.load(f))
+
+    def _save_dirty(self) -> None:
+        # Persisted so a note added just before a restart still triggers a re-embed.
+        if not self.path:
+            return
+        Path(self.path).mkdir(parents=True, exist_ok=True)
+        with open(Path(self.path) / DIRTY_FILE, "w", encoding="utf-8") as f:
+            json.dump(sorted(self._dirty), f)
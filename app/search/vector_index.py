@@ -0,0 +1,181 @@
+"""In-memory vector index with cosine top-k search.
+
+Rows are stored L2-normalised as one float32 matrix, so a query is a single
+matrix-vector product followed by `argpartition`. Each row carries an integer ID
+and a metadata dict that can be used to filter candidates before scoring.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.json"
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def matches_filters(meta: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Case-insensitive equality; a list/set/tuple value means "any of these"."""
+    for field, wanted in where.items():
+        value = str(meta.get(field, "")).lower()
+        options = wanted if isinstance(wanted, (list, set, tuple)) else [wanted]
+        if value not in {str(o).lower() for o in options}:
+            return False
+    return True
+
+
+class VectorIndex:
+
+    def __init__(self, dim: int = 0):
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self.ids: List[int] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self._row_of: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._row_of
+
+    @property
+    def dim(self) -> int:
+        return self._matrix.shape[1]
+
+    def get_metadata(self, item_id: int) -> Optional[Dict[str, Any]]:
+        row = self._row_of.get(item_id)
+        return None if row is None else self.metadata[row]
+
+    def upsert(
+        self,
+        ids: Sequence[int],
+        vectors: np.ndarray,
+        metadata: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> None:
+        """Insert new rows or replace existing ones in place."""
+        if not len(ids):
+            return
+        vectors = _normalise(vectors)
+        metadata = list(metadata) if metadata is not None else [{} for _ in ids]
+        if not len(self):
+            self._matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+
+        # A memory-mapped matrix is read-only; take a private copy before writing.
+        if not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix)
+
+        # Last write wins if an ID appears twice in one call.
+        items = {item_id: (vector, meta) for item_id, vector, meta in zip(ids, vectors, metadata)}
+        new_rows = []
+        for item_id, (vector, meta) in items.items():
+            row = self._row_of.get(item_id)
+            if row is None:
+                self._row_of[item_id] = len(self.ids) + len(new_rows)
+                new_rows.append((item_id, vector, meta))
+            else:
+                self._matrix[row] = vector
+                self.metadata[row] = meta
+
+        if new_rows:
+            self._matrix = np.vstack([self._matrix, np.stack([v for _, v, _ in new_rows])])
+            self.ids.extend(i for i, _, _ in new_rows)
+            self.metadata.extend(m for _, _, m in new_rows)
+
+    def remove(self, ids: Iterable[int]) -> None:
+        doomed = {self._row_of[i] for i in ids if i in self._row_of}
+        if not doomed:
+            return
+        keep = [row for row in range(len(self.ids)) if row not in doomed]
+        self._matrix = np.array(self._matrix[keep])
+        self.ids = [self.ids[row] for row in keep]
+        self.metadata = [self.metadata[row] for row in keep]
+        self._row_of = {item_id: row for row, item_id in enumerate(self.ids)}
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        ids: Optional[Iterable[int]] = None,
+        min_score: Optional[float] = None,
+    ) -> List[Tuple[int, float]]:
+        """Return up to `k` `(id, cosine score)` pairs, best first.
+
+        `ids` restricts the search to those rows; `where` filters on metadata.
+        """
+        if not len(self) or k <= 0:
+            return []
+
+        if ids is None and not where:
+            rows = None
+            matrix = self._matrix
+        else:
+            candidates = range(len(self.ids)) if ids is None else sorted(
+                self._row_of[i] for i in set(ids) if i in self._row_of
+            )
+            rows = np.array([r for r in candidates if not where or matches_filters(self.metadata[r], where)], dtype=np.int64)
+            if not rows.size:
+                return []
+            matrix = self._matrix[rows]
+
+        scores = matrix @ _normalise(query)[0]
+        if k < scores.size:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.size)
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for local in top:
+            score = float(scores[local])
+            if min_score is not None and score < min_score:
+                break
+            row = int(local) if rows is None else int(rows[local])
+            results.append((self.ids[row], score))
+        return results
+
+    def save(self, path: str) -> None:
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so a reader that has the old file memory-mapped keeps a valid view.
+        tmp_vectors = directory / f"{VECTORS_FILE}.tmp"
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, np.ascontiguousarray(self._matrix))
+        tmp_meta = directory / f"{META_FILE}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "metadata": self.metadata}, f)
+        os.replace(tmp_vectors, directory / VECTORS_FILE)
+        os.replace(tmp_meta, directory / META_FILE)
+
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        """Load a saved index; vectors are memory-mapped rather than read eagerly."""
+        directory = Path(path)
+        index = cls()
+        index._matrix = np.load(directory / VECTORS_FILE, mmap_mode="r")
+        with open(directory / META_FILE, encoding="utf-8") as f:
+            meta = json.load(f)
+        index.ids = [int(i) for i in meta["ids"]]
+        index.metadata = meta["metadata"]
+        index._row_of = {item_id: row for row, item_id in enumerate(index.ids)}
+        return index
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        directory = Path(path)
+        return (directory / VECTORS_FILE).exists() and (directory / META_FILE).exists()
@@ -0,0 +1,88 @@
+"""Download the Rick & Morty universe into the local snapshot store.
+
+    python app/sync_snapshot.py            # full sync of characters, locations and episodes
+    python app/sync_snapshot.py --delta    # only fetch IDs past the last known max
+                                           # (locations are always re-pulled in full)
+
+Once a snapshot exists the Streamlit app and batch runner read from it instead
+of the public API.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict
+
+# Ensure project root is on sys.path so `import app...` works when run as a script.
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(_PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(_PROJECT_ROOT))
+
+from app.api.rick_morty_client import BASE_URL, RickMortyClient
+from app.persistence.snapshot_store import RESOURCES, SNAPSHOT_PATH, SnapshotStore
+
+# New characters are listed as residents of existing locations, which a delta would
+# never re-fetch; locations are only a handful of pages, so they are always synced in full.
+ALWAYS_FULL = ("location",)
+
+
+def full_sync(client: RickMortyClient, store: SnapshotStore, resource: str) -> int:
+    fetch_all = {
+        "character": client.get_all_characters,
+        "location": client.get_all_locations,
+        "episode": client.get_all_episodes,
+    }[resource]
+    items = fetch_all()
+    store.upsert(resource, items)
+    store.mark_synced(resource)
+    return len(items)
+
+
+def delta_sync(client: RickMortyClient, store: SnapshotStore, resource: str) -> int:
+    """Fetch records with IDs above the stored maximum until the API returns none.
+
+    Existing records are not re-fetched; `main` syncs `ALWAYS_FULL` resources in
+    full instead, and a full sync picks up any other edits.
+    """
+    next_id = store.max_id(resource) + 1
+    added = 0
+    while True:
+        items = client.get_by_ids(resource, list(range(next_id, next_id + client.batch_size)))
+        if not items:
+            break
+        store.upsert(resource, items)
+        added += len(items)
+        next_id += client.batch_size
+    store.mark_synced(resource)
+    return added
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sync the local Rick & Morty snapshot.")
+    parser.add_argument("--db", default=SNAPSHOT_PATH, help="snapshot SQLite file")
+    parser.add_argument("--base-url", default=BASE_URL, help="API root to sync from")
+    parser.add_argument("--delta", action="store_true",
+                        help="only fetch IDs past the last known max (locations are still synced in full)")
+    parser.add_argument("--resource", choices=RESOURCES, action="append",
+                        help="limit the sync to one resource (repeatable)")
+    args = parser.parse_args()
+
+    # The sync itself must hit the network, so this client has no snapshot attached.
+    client = RickMortyClient(base_url=args.base_url)
+    store = SnapshotStore(args.db)
+    counts: Dict[str, int] = {}
+    for resource in args.resource or RESOURCES:
+        # A delta only makes sense on top of an existing full sync.
+        if args.delta and store.has(resource) and resource not in ALWAYS_FULL:
+            counts[resource] = delta_sync(client, store, resource)
+        else:
+            counts[resource] = full_sync(client, store, resource)
+        print(f"{resource}: {counts[resource]} records written ({store.count(resource)} total)", file=sys.stderr)
+    print(json.dumps(counts), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
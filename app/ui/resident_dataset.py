@@ -0,0 +1,103 @@
+"""Lazily loaded residents of one location, shared by every UI section.
+
+Character records and notes are fetched a page at a time, only when a page is
+first needed; the next page can be prefetched in the background. Sections that
+need every resident (summary, search) call `all()`, which bulk-loads only the
+residents that no page has loaded yet.
+"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, List, Optional
+
+from app.api.rick_morty_client import id_from_url
+from app.metrics import propagate
+
+RESIDENTS_PER_PAGE = 10
+
+
+class ResidentDataset:
+
+    def __init__(self, location: Dict[str, Any], fetch_characters: Callable[[List[str]], List[Dict[str, Any]]],
+                 notes_repo, page_size: int = RESIDENTS_PER_PAGE, executor: Optional[Executor] = None):
+        # `fetch_characters` resolves character URLs in bulk, e.g. `client.get_characters_by_urls`.
+        self.location = location
+        self.urls: List[str] = list(location.get("residents") or [])
+        self.ids: List[int] = [id_from_url(url) for url in self.urls]
+        self._url_of = dict(zip(self.ids, self.urls))
+        self.fetch_characters = fetch_characters
+        self.notes_repo = notes_repo
+        self.page_size = page_size
+        self.executor = executor
+        self._characters: Dict[int, Dict[str, Any]] = {}
+        self._notes: Dict[int, List[tuple]] = {}
+        self._prefetching: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.urls) // self.page_size))
+
+    def page(self, number: int) -> List[Dict[str, Any]]:
+        """Residents (`{"character", "notes"}`) on 0-based page `number`."""
+        future = self._prefetching.pop(number, None)
+        if future is not None:
+            future.result()
+        start = number * self.page_size
+        return self._residents(self.ids[start:start + self.page_size])
+
+    def prefetch(self, number: int) -> None:
+        """Start loading page `number` in the background, if there is an executor and such a page."""
+        if self.executor is None or not 0 <= number < self.page_count or number in self._prefetching:
+            return
+        start = number * self.page_size
+        ids = self.ids[start:start + self.page_size]
+        if all(i in self._characters for i in ids):
+            return
+        self._prefetching[number] = self.executor.submit(propagate(self._load), ids)
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Every resident, loading whatever hasn't been loaded yet in one bulk call."""
+        for future in list(self._prefetching.values()):
+            future.result()
+        self._prefetching.clear()
+        return self._residents(self.ids)
+
+    def characters(self) -> List[Dict[str, Any]]:
+        return [r["character"] for r in self.all()]
+
+    def note_rows(self, character_id: int) -> List[tuple]:
+        """`(note, created_at)` rows for a loaded character, newest first."""
+        with self._lock:
+            return list(self._notes.get(character_id, []))
+
+    def refresh_notes(self, character_id: int) -> None:
+        notes = self.notes_repo.get_notes(character_id)
+        with self._lock:
+            self._notes[character_id] = notes
+
+    def _residents(self, ids: List[int]) -> List[Dict[str, Any]]:
+        self._load(ids)
+        with self._lock:
+            return [
+                {"character": self._characters[i], "notes": [n for n, _ in self._notes.get(i, [])]}
+                for i in ids if i in self._characters
+            ]
+
+    def _load(self, ids: List[int]) -> None:
+        with self._lock:
+            missing = [i for i in dict.fromkeys(ids) if i not in self._characters]
+        if not missing:
+            return
+        urls = [self._url_of[i] for i in missing]
+        characters = self.fetch_characters(urls)
+        notes = self.notes_repo.get_notes_for_characters([c["id"] for c in characters])
+        with self._lock:
+            for character in characters:
+                self._characters[character["id"]] = character
+            self._notes.update(notes)
@@ -15,7 +15,9 @@ This file focuses on user interaction, display, and workflow.
 
 from __future__ import annotations
 
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Ensure project root is on sys.path so `import app...` works when executed by Streamlit.
@@ -25,20 +27,77 @@ if str(_PROJECT_ROOT) not in sys.path:
 
 import streamlit as st
 
-from app.api.rick_morty_client import RickMortyClient
+from app.api.response_cache import ResponseCache
+from app.api.rick_morty_client import AsyncRickMortyClient, RickMortyClient
 from app.llm.llm_service import LLMService
 from app.evaluation.evaluator import Evaluator
 from app.persistence.notes_repository import NotesRepository
+from app.persistence.snapshot_store import SnapshotStore
 from app.llm.embeddings import EmbeddingService
+from app.metrics import Metrics, collect, profile_summary, profiled
+from app.search.character_index import CharacterIndex
+from app.ui.resident_dataset import ResidentDataset
+
+# Set RICK_MORTY_DEBUG=1 to show per-rerun call accounting (and an optional profiler) in the sidebar.
+DEBUG_PANEL = os.getenv("RICK_MORTY_DEBUG") == "1"
+
+
+@st.cache_resource
+def get_snapshot():
+    # Present only after `python app/sync_snapshot.py`; otherwise everything comes from the API.
+    return SnapshotStore() if SnapshotStore.exists() else None
+
+
+@st.cache_resource
+def get_client() -> RickMortyClient:
+    # One client per server process so the in-memory cache tier survives reruns.
+    return RickMortyClient(cache=ResponseCache(), snapshot=get_snapshot())
+
+
+@st.cache_resource
+def get_async_client() -> AsyncRickMortyClient:
+    # Resolves resident URLs concurrently; shares the sync client's response cache.
+    return AsyncRickMortyClient(cache=get_client().cache, snapshot=get_snapshot())
+
+
+@st.cache_resource
+def get_embedding_service() -> EmbeddingService:
+    # Shared so the in-memory embedding cache survives reruns.
+    return EmbeddingService()
+
+
+@st.cache_resource
+def get_llm() -> LLMService:
+    # Shared so the in-memory response cache survives reruns.
+    return LLMService()
+
+
+@st.cache_resource
+def get_notes_repo() -> NotesRepository:
+    return NotesRepository()
+
+
+@st.cache_resource
+def get_character_index() -> CharacterIndex:
+    # Loaded from disk once per process; rows are added as characters are searched.
+    return CharacterIndex(get_embedding_service(), get_notes_repo())
+
+
+@st.cache_resource
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    # Loads the next residents page in the background while the current one renders.
+    return ThreadPoolExecutor(max_workers=2)
 
 
 def main() -> None:
     # Initialize service objects for API, notes, LLM, evaluation, and embeddings
-    client = RickMortyClient()
-    notes_repo = NotesRepository()
-    llm = LLMService()
-    evaluator = Evaluator()
-    embedding_service = EmbeddingService()
+    client = get_client()
+    async_client = get_async_client()
+    notes_repo = get_notes_repo()
+    llm = get_llm()
+    embedding_service = get_embedding_service()
+    evaluator = Evaluator(embedding_service=embedding_service)
+    char_index = get_character_index()
 
     # Load all locations from the API (with error handling)
     try:
@@ -51,6 +110,10 @@ def main() -> None:
         )
         st.stop()
 
+    snapshot = get_snapshot()
+    if snapshot is not None and snapshot.has("location"):
+        st.sidebar.caption("Using the local data snapshot (refresh with `python app/sync_snapshot.py --delta`).")
+
     # --- Location selection UI ---
     location_names = [loc["name"] for loc in locations]
     selected_name = st.selectbox("Select Location", location_names)
@@ -62,26 +125,27 @@ def main() -> None:
     # Show location type and dimension
     st.caption(f"Type: {location.get('type', '—')} | Dimension: {location.get('dimension', '—')}")
 
-    # --- Gather all character details and notes for the selected location ---
-    residents = []
-    all_notes = []
-    for resident_url in location["residents"]:
-        character = client.get_character_by_url(resident_url)
-        # Get all notes for this character
-        notes = notes_repo.get_notes(character["id"])
-        note_texts = [n for n, _ in notes]
-        all_notes.extend(note_texts)
-        residents.append({
-            "character": character,
-            "notes": note_texts
-        })
-
+    # --- Residents of the selected location: loaded lazily, one dataset shared by every section ---
+    dataset = st.session_state.get('resident_dataset')
+    if dataset is None or dataset.location["id"] != location["id"]:
+        dataset = ResidentDataset(
+            location, async_client.get_characters_by_urls_sync, notes_repo, executor=get_prefetch_executor()
+        )
+        st.session_state['resident_dataset'] = dataset
 
+    regenerate = st.checkbox("Regenerate (ignore cached summary and verdict)", key="llm_refresh")
     if st.button("Generate AI Summary"):
-        summary = llm.generate_location_summary(location, residents)
-        scores = evaluator.evaluate(summary, location, residents=residents)
+        residents = dataset.all()
         st.subheader("AI Summary")
-        st.write(summary)
+        # Tokens render as they arrive, so users wait for the first token, not the whole reply.
+        summary = st.write_stream(llm.stream_location_summary(location, residents, refresh=regenerate)).strip()
+        # Rubric, embedding similarity and the LLM judge (independent, not using our
+        # scores) run concurrently; the judge starts as soon as the summary is complete.
+        with st.spinner("Evaluating summary..."):
+            result = evaluator.evaluate_pipeline(summary, location, residents=residents, llm=llm, refresh=regenerate)
+        for stage, error in result.errors.items():
+            st.warning(f"Evaluation stage '{stage}' unavailable: {error}")
+        scores = result.rubric
 
         # --- Enhanced Evaluation UI ---
         st.markdown("### Evaluation Results by scoring function 🏆")
@@ -97,41 +161,26 @@ def main() -> None:
             st.markdown("**Completeness**")
             st.write(render_stars(scores.get("completeness", 0)))
 
-        st.markdown("**Semantic Similarity** (Embedding-based metric)")
-        sim = float(scores.get("semantic_similarity", 0))
-        st.progress(sim)
-        st.write(f"{int(sim * 100)}% similar")
-
-        # LLM as a judge (independent, not using our scores)
-        # Prepare a source context for the LLM: location, residents, and notes
-        source_context = f"Location: {location['name']}\nType: {location.get('type', '-')}, Dimension: {location.get('dimension', '-')}\n"
-        for r in residents:
-            c = r["character"]
-            notes = r["notes"]
-            source_context += f"\nResident: {c.get('name', '-')}, Status: {c.get('status', '-')}, Species: {c.get('species', '-')}, Gender: {c.get('gender', '-')}, Origin: {(c.get('origin') or {}).get('name', '-')}, Current location: {(c.get('location') or {}).get('name', '-')}, Episodes: {len(c.get('episode') or [])}"
-            if notes:
-                source_context += f"\n  Notes: {'; '.join(notes)}"
-
-        judge_prompt = f"""
-You are an expert judge for Rick & Morty summaries. Here is the source information about a location and its residents, and an AI-generated summary.\n\nSOURCE:\n{source_context}\n\nAI SUMMARY:\n{summary}\n\nYour task:\n- Give a Factual score (1-5) for how factually accurate the summary is compared to the source.\n- Give a Creativity score (1-5) for how creative or entertaining the summary is.\n- Give a Completeness score (1-5) for how well the summary covers the important details from the source.\n- Then, provide a 1-2 sentence verdict on the summary's overall quality.\n\nRespond in this JSON format:\n{{\n  \"factual\": <int>,\n  \"creativity\": <int>,\n  \"completeness\": <int>,\n  \"verdict\": <string>\n}}"""
-        judge_response = llm.generate_judge_verdict(judge_prompt)
-        import json
-        try:
-            judge_json = json.loads(judge_response)
-        except Exception:
-            judge_json = {"factual": "-", "creativity": "-", "completeness": "-", "verdict": judge_response}
-        st.subheader("LLM Judge (Independent)")
-        colj1, colj2, colj3 = st.columns(3)
-        with colj1:
-            st.markdown("**Factual**")
-            st.write(render_stars(judge_json.get("factual", 0)))
-        with colj2:
-            st.markdown("**Creativity**")
-            st.write(render_stars(judge_json.get("creativity", 0)))
-        with colj3:
-            st.markdown("**Completeness**")
-            st.write(render_stars(judge_json.get("completeness", 0)))
-        st.markdown(f"**Verdict:** {judge_json.get('verdict', judge_response)}")
+        if result.semantic_similarity is not None:
+            st.markdown("**Semantic Similarity** (Embedding-based metric)")
+            sim = min(1.0, max(0.0, result.semantic_similarity))
+            st.progress(sim)
+            st.write(f"{int(sim * 100)}% similar")
+
+        if result.judge is not None:
+            judge_json = result.judge
+            st.subheader("LLM Judge (Independent)")
+            colj1, colj2, colj3 = st.columns(3)
+            with colj1:
+                st.markdown("**Factual**")
+                st.write(render_stars(judge_json.get("factual", 0)))
+            with colj2:
+                st.markdown("**Creativity**")
+                st.write(render_stars(judge_json.get("creativity", 0)))
+            with colj3:
+                st.markdown("**Completeness**")
+                st.write(render_stars(judge_json.get("completeness", 0)))
+            st.markdown(f"**Verdict:** {judge_json.get('verdict', '-')}")
 
     # --- Unified Semantic Search for Characters (Details + Notes) in Selected Location ---
     st.subheader("🔍 AI Semantic Search: Characters (Details + Notes)")
@@ -152,11 +201,22 @@ You are an expert judge for Rick & Morty summaries. Here is the source informati
         st.session_state['char_search_text'] = st.session_state['char_note_search']
         st.session_state['char_search_triggered'] = False
     char_query = st.text_input(
-        "Search characters in this location (details & notes included)",
+        "Search characters (details & notes included)",
         value=st.session_state['char_search_text'],
         key="char_note_search",
         on_change=update_char_search_text
     )
+    scope = st.radio("Search in", ["This location", "All locations"], horizontal=True, key="char_search_scope")
+    search_mode = st.radio(
+        "Match on", ["Hybrid", "Meaning only", "Keywords in notes"], horizontal=True, key="char_search_mode"
+    )
+    fcol1, fcol2, fcol3 = st.columns(3)
+    with fcol1:
+        status_filter = st.selectbox("Status", ["Any", "Alive", "Dead", "unknown"], key="char_filter_status")
+    with fcol2:
+        species_filter = st.text_input("Species", key="char_filter_species")
+    with fcol3:
+        location_filter = st.text_input("Current location", key="char_filter_location")
     search_button = st.button("Search Characters", key="search_char_btn")
     # Only search if triggered by button or Enter
     if search_button or (char_query != '' and char_query == st.session_state['char_search_text'] and not st.session_state['char_search_triggered']):
@@ -164,35 +224,66 @@ You are an expert judge for Rick & Morty summaries. Here is the source informati
         st.session_state['char_search_triggered'] = True
     # Only search if triggered and text is not empty
     if st.session_state['char_search_triggered'] and st.session_state['char_search_text']:
-        # Embed the query and all character details+notes, then rank by similarity
-        char_query_emb = embedding_service.embed(st.session_state['char_search_text'])
-        char_items = []  # (character, full_text)
-        for resident_url in location["residents"]:
-            character = client.get_character_by_url(resident_url)
-            notes = notes_repo.get_notes(character["id"])
-            notes_text = "; ".join([n for n, _ in notes])
-            char_details = f"Name: {character.get('name', '-')}; Status: {character.get('status', '-')}; Species: {character.get('species', '-')}; Gender: {character.get('gender', '-')}; Origin: {(character.get('origin') or {}).get('name', '-')}; Current location: {(character.get('location') or {}).get('name', '-')}; Episodes: {len(character.get('episode') or [])}; Notes: {notes_text}"
-            char_items.append((character, char_details))
-        char_corpus = [full_text for _, full_text in char_items]
-        char_embs = [embedding_service.embed(text) for text in char_corpus]
-        import numpy as np
-        char_sims = [embedding_service.cosine_similarity(char_query_emb, emb) for emb in char_embs]
+        where = {}
+        if status_filter != "Any":
+            where["status"] = status_filter
+        if species_filter.strip():
+            where["species"] = species_filter.strip()
+        if location_filter.strip():
+            where["location"] = location_filter.strip()
+        candidates = None
+        if scope == "This location":
+            scope_ids = dataset.ids
+        elif snapshot is not None and snapshot.has("character"):
+            # Filter the whole universe in SQL, so only matching characters need index rows.
+            candidates = snapshot.query_characters(
+                status=where.get("status"), species=where.get("species"), location=where.get("location")
+            )
+            scope_ids = [c["id"] for c in candidates]
+        else:
+            scope_ids = None
+        # Keyword mode needs no index rows; the other modes embed any candidate not indexed yet.
+        if search_mode != "Keywords in notes":
+            if scope == "All locations":
+                char_index.ensure(candidates if candidates is not None else client.get_all_characters())
+            # Only resolve the residents if some of them aren't indexed yet.
+            elif any(i not in char_index for i in scope_ids):
+                char_index.ensure(dataset.characters())
         # Set a minimum similarity threshold
         SIM_THRESHOLD = 0.3
         # Show top 5 most similar characters above threshold
-        top_char_idx = [i for i in np.argsort(char_sims)[::-1] if char_sims[i] >= SIM_THRESHOLD][:5]
+        if search_mode == "Keywords in notes":
+            # Full-text match only: no embedding request for the query.
+            matches = char_index.keyword_search(
+                st.session_state['char_search_text'], k=5, where=where, ids=scope_ids,
+                fetch_characters=lambda ids: client.get_by_ids("character", ids),
+            )
+        else:
+            matches = char_index.search(
+                st.session_state['char_search_text'], k=5, where=where, ids=scope_ids,
+                min_score=SIM_THRESHOLD, hybrid=search_mode == "Hybrid"
+            )
         st.markdown("#### Top Matching Characters (Details + Notes):")
-        if not top_char_idx:
+        if not matches:
             st.info("No relevant characters found for your search.")
         else:
-            for idx in top_char_idx:
-                character, full_text = char_items[idx]
-                st.write(f"**{character.get('name', '-')}** — {full_text}")
+            for meta, _ in matches:
+                st.write(f"**{meta.get('name', '-')}** — {meta['document']}")
 
-    # Always show Residents section for the selected location
+    # Always show Residents section for the selected location, one page at a time
     st.subheader("Residents")
-    for resident_url in location["residents"]:
-        character = client.get_character_by_url(resident_url)
+    if not len(dataset):
+        st.info("No known residents.")
+        return
+    page_number = st.number_input(
+        f"Page (of {dataset.page_count}, {len(dataset)} residents)",
+        min_value=1, max_value=dataset.page_count, value=1, step=1, key=f"resident_page_{location['id']}"
+    ) - 1
+    page = dataset.page(page_number)
+    # Warm the next page while this one renders.
+    dataset.prefetch(page_number + 1)
+    for resident in page:
+        character = resident["character"]
         with st.expander(character["name"]):
             st.image(character["image"], width=150)
             st.write(f"Status: {character['status']}")
@@ -213,10 +304,10 @@ You are an expert judge for Rick & Morty summaries. Here is the source informati
             note = st.text_area("Add Note (max 100 chars)", key=character["id"], max_chars=100)
             if st.button("Save Note", key=f"save_{character['id']}"):
                 notes_repo.add_note(character["id"], note)
+                dataset.refresh_notes(character["id"])
 
             st.caption("All notes for this character")
-            notes = notes_repo.get_notes(character["id"])
-            for n, ts in notes:
+            for n, ts in dataset.note_rows(character["id"]):
                 st.write(f"📝 {n} ({ts})")
 
 def render_stars(score, max_stars=5):
@@ -229,5 +320,40 @@ def render_stars(score, max_stars=5):
     return f"{stars} ({score}/{max_stars})"
 
 
+def render_debug_panel(metrics: Metrics, profile=None) -> None:
+    """Sidebar table of what this rerun spent in the API, LLM, embeddings and notes DB."""
+    stages = metrics.stages()
+    with st.sidebar.expander("Debug: this rerun", expanded=True):
+        if not stages:
+            st.caption("No instrumented calls in this rerun.")
+        else:
+            st.dataframe([
+                {
+                    "stage": name,
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "total ms": round(stats.total_s * 1000, 1),
+                    "max ms": round(stats.max_s * 1000, 1),
+                    "bytes": stats.bytes,
+                    "tokens": stats.tokens,
+                }
+                for name, stats in stages.items()
+            ], hide_index=True)
+            st.download_button("Metrics (JSON)", metrics.to_json(), file_name="metrics.json")
+            st.download_button("Metrics (Prometheus)", metrics.to_prometheus(), file_name="metrics.prom")
+        if profile is not None:
+            st.code(profile_summary(profile), language="text")
+
+
+def run() -> None:
+    # Each rerun gets its own collector, so the debug panel shows only this rerun's calls.
+    metrics = Metrics()
+    profile_run = DEBUG_PANEL and st.sidebar.checkbox("Profile this rerun (cProfile)")
+    with collect(metrics), profiled(enabled=profile_run) as profile:
+        main()
+    if DEBUG_PANEL:
+        render_debug_panel(metrics, profile)
+
+
 if __name__ == "__main__":
-    main()
+    run()
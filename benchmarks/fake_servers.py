@@ -0,0 +1,310 @@
+"""Local stand-ins for the Rick & Morty API and the OpenAI API.
+
+Both servers run in a background thread on an ephemeral port, generate
+deterministic data, add configurable latency and count every request so the
+benchmarks can report outbound calls per scenario.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+PAGE_SIZE = 20
+EMBEDDING_DIM = 64
+
+SPECIES = ["Human", "Alien", "Cronenberg", "Robot", "Humanoid", "Mythological Creature"]
+STATUSES = ["Alive", "Dead", "unknown"]
+LOCATION_TYPES = ["Planet", "Space station", "Dimension", "Microverse", "Resort"]
+
+
+def build_universe(n_characters: int = 300, n_locations: int = 30, n_episodes: int = 51,
+                   big_location_residents: int = 200) -> Dict[str, List[Dict[str, Any]]]:
+    """Deterministic fake universe; location 1 is an Earth-sized location with many residents."""
+    base = "{base}"  # replaced with the server's URL when served
+    characters = []
+    for i in range(1, n_characters + 1):
+        location_id = 1 if i <= big_location_residents else 2 + (i % (n_locations - 1))
+        characters.append({
+            "id": i,
+            "name": f"Character {i}",
+            "status": STATUSES[i % len(STATUSES)],
+            "species": SPECIES[i % len(SPECIES)],
+            "type": "",
+            "gender": "Female" if i % 2 else "Male",
+            "origin": {"name": f"Location {1 + i % n_locations}", "url": f"{base}/location/{1 + i % n_locations}"},
+            "location": {"name": f"Location {location_id}", "url": f"{base}/location/{location_id}"},
+            "image": f"{base}/character/avatar/{i}.jpeg",
+            "episode": [f"{base}/episode/{1 + (i + k) % n_episodes}" for k in range(1 + i % 4)],
+            "url": f"{base}/character/{i}",
+        })
+    locations = []
+    for i in range(1, n_locations + 1):
+        residents = [c["url"] for c in characters if c["location"]["url"].endswith(f"/location/{i}")]
+        locations.append({
+            "id": i,
+            "name": f"Location {i}",
+            "type": LOCATION_TYPES[i % len(LOCATION_TYPES)],
+            "dimension": f"Dimension C-{100 + i}",
+            "residents": residents,
+            "url": f"{base}/location/{i}",
+        })
+    episodes = [
+        {"id": i, "name": f"Episode {i}", "episode": f"S{1 + i // 11:02d}E{1 + i % 11:02d}",
+         "characters": [c["url"] for c in characters if c["id"] % n_episodes == i % n_episodes],
+         "url": f"{base}/episode/{i}"}
+        for i in range(1, n_episodes + 1)
+    ]
+    return {"character": characters, "location": locations, "episode": episodes}
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """Deterministic bag-of-words vector: texts sharing words get similar vectors."""
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.sha256(word.encode("utf-8")).digest()
+        vector[digest[0] % dim] += 1.0
+        vector[digest[1] % dim] += 0.5
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class _Server:
+    """Threaded HTTP server with request counters and an artificial latency."""
+
+    def __init__(self, handler_cls, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler_cls)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[key] += n
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.counts.clear()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+        # One handler per TCP connection; keep-alive requests reuse it.
+        self.server.owner.count("connections")
+
+    @property
+    def owner(self):
+        return self.server.owner
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class _RickMortyHandler(_Handler):
+
+    def do_GET(self) -> None:
+        api = self.owner
+        time.sleep(api.latency_s)
+        api.count("requests")
+        if api.rate_limit_every and api.counts["requests"] % api.rate_limit_every == 0:
+            api.count("429")
+            self._send_json(429, {"error": "rate limited"}, {"Retry-After": "0"})
+            return
+
+        parsed = urlparse(self.path)
+        parts = [p for p in parsed.path.split("/") if p]
+        if len(parts) < 2 or parts[0] != "api" or parts[1] not in api.universe:
+            self._send_json(404, {"error": "There is nothing here"})
+            return
+        resource = parts[1]
+        items = api.universe[resource]
+
+        if len(parts) == 3:
+            api.count(f"{resource}:by_id")
+            wanted = [int(i) for i in parts[2].split(",") if i.isdigit()]
+            by_id = {item["id"]: item for item in items}
+            found = [api.render(by_id[i]) for i in wanted if i in by_id]
+            if "," not in parts[2]:
+                if not found:
+                    self._send_json(404, {"error": "Character not found"})
+                    return
+                body: Any = found[0]
+            else:
+                body = found
+        else:
+            api.count(f"{resource}:page")
+            page = int(parse_qs(parsed.query).get("page", ["1"])[0])
+            pages = max(1, -(-len(items) // PAGE_SIZE))
+            root = f"{api.url}/api/{resource}"
+            body = {
+                "info": {
+                    "count": len(items),
+                    "pages": pages,
+                    "next": f"{root}?page={page + 1}" if page < pages else None,
+                    "prev": f"{root}?page={page - 1}" if page > 1 else None,
+                },
+                "results": [api.render(i) for i in items[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]],
+            }
+
+        etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            api.count("304")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send_json(200, body, {"ETag": etag})
+
+
+class FakeRickMortyAPI(_Server):
+    """Serves `/api/{character,location,episode}` with pagination, multi-ID lookups and ETags.
+
+    `rate_limit_every=N` answers every Nth request with a 429 (Retry-After: 0).
+    """
+
+    def __init__(self, latency_s: float = 0.02, rate_limit_every: int = 0, **universe_kwargs):
+        super().__init__(_RickMortyHandler, latency_s)
+        self.rate_limit_every = rate_limit_every
+        self.universe = build_universe(**universe_kwargs)
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/api"
+
+    def render(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return json.loads(json.dumps(item).replace("{base}", self.api_url))
+
+
+class _OpenAIHandler(_Handler):
+
+    def do_POST(self) -> None:
+        api = self.owner
+        time.sleep(api.latency_s)
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        api.count("requests")
+        if api.rate_limit_every and api.counts["requests"] % api.rate_limit_every == 0:
+            api.count("429")
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                            {"Retry-After": "0"})
+            return
+
+        path = urlparse(self.path).path
+        if path.endswith("/embeddings"):
+            inputs = body.get("input")
+            inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+            api.count("embeddings")
+            api.count("embedding_inputs", len(inputs))
+            self._send_json(200, {
+                "object": "list",
+                "model": body.get("model"),
+                "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(t)} for i, t in enumerate(inputs)],
+                "usage": {"prompt_tokens": sum(len(t) // 4 for t in inputs), "total_tokens": sum(len(t) // 4 for t in inputs)},
+            })
+        elif path.endswith("/chat/completions"):
+            api.count("chat")
+            prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+            text = api.reply(prompt)
+            usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                     "total_tokens": (len(prompt) + len(text)) // 4}
+            if body.get("stream"):
+                self._stream(body, text, usage)
+            else:
+                self._send_json(200, {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": 0, "model": body.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": text}}],
+                    "usage": usage,
+                })
+        else:
+            self._send_json(404, {"error": {"message": "unknown endpoint"}})
+
+    def _stream(self, body: Dict[str, Any], text: str, usage: Dict[str, int]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def emit(payload: str) -> None:
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0, "model": body.get("model")}
+        for word in re.findall(r"\S+\s*", text):
+            time.sleep(self.owner.token_latency_s)
+            emit(json.dumps({**base, "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}))
+        emit(json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            emit(json.dumps({**base, "choices": [], "usage": usage}))
+        emit("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeOpenAI(_Server):
+    """Serves `/v1/chat/completions` (plain and streaming) and `/v1/embeddings`.
+
+    Embeddings are deterministic bag-of-words vectors; judge prompts get a JSON verdict.
+    `rate_limit_every=N` answers every Nth request with a 429.
+    """
+
+    def __init__(self, latency_s: float = 0.05, token_latency_s: float = 0.0, rate_limit_every: int = 0):
+        super().__init__(_OpenAIHandler, latency_s)
+        self.token_latency_s = token_latency_s
+        self.rate_limit_every = rate_limit_every
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1/"
+
+    @staticmethod
+    def reply(prompt: str) -> str:
+        if "expert judge" in prompt:
+            return json.dumps({"factual": 4, "creativity": 3, "completeness": 4,
+                               "verdict": "Accurate and reasonably entertaining."})
+        match = re.search(r"Location Name: (.+)", prompt) or re.search(r"residents of (.+?) in", prompt)
+        name = match.group(1).strip() if match else "this place"
+        return (f"{name} is home to a chaotic crowd of residents. Some are alive, some are dead, "
+                f"and a few are Cronenbergs. Rick would not visit {name} twice.")
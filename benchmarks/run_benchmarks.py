@@ -0,0 +1,431 @@
+"""End-to-end benchmarks against local stand-ins for the Rick & Morty API and OpenAI.
+
+Each scenario runs in a fresh temporary working directory (so every `db/...`
+cache starts empty), times the measured step and counts the outbound calls it
+made: Rick & Morty HTTP requests, OpenAI chat / embedding requests and SQLite
+statements. Results are compared against `benchmarks/baseline.json`; more calls
+than the baseline, or a run slower than the allowed tolerance, is a regression.
+
+    python benchmarks/run_benchmarks.py                     # run and compare
+    python benchmarks/run_benchmarks.py --update-baseline   # record a new baseline
+    python benchmarks/run_benchmarks.py -s summary -s search_cold --api-latency-ms 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Ensure project root is on sys.path so `import app...` works when run as a script.
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(_PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(_PROJECT_ROOT))
+
+import openai
+
+from app.api.response_cache import ResponseCache
+from app.api.rick_morty_client import AsyncRickMortyClient, RickMortyClient
+from app.evaluation.evaluator import Evaluator
+from app.llm.embeddings import EmbeddingService
+from app.llm.llm_service import LLMService
+from app.llm.openai_scheduler import OpenAIScheduler
+from app.persistence.notes_repository import NotesRepository
+from app.search.character_index import CharacterIndex
+from app.ui.resident_dataset import ResidentDataset
+from benchmarks.fake_servers import FakeOpenAI, FakeRickMortyAPI
+
+BASELINE_PATH = _PROJECT_ROOT / "benchmarks" / "baseline.json"
+# Location 1 of the fake universe; large enough to trigger map-reduce summarization.
+BIG_LOCATION_ID = 1
+# Wall-clock slack before a slower run counts as a regression.
+DEFAULT_TOLERANCE = 0.5
+MIN_SLOWDOWN_S = 0.05
+
+SEED_NOTES = [
+    (3, "Keeps a portal gun hidden in the garage"),
+    (7, "Turned himself into a pickle to avoid therapy"),
+    (12, "Runs an interdimensional cable network"),
+    (25, "Afraid of squirrels since the incident"),
+    (40, "Owes Rick money from a blips and chitz bet"),
+]
+
+
+class _SQLiteCounter:
+    """Counts statements on every SQLite connection opened while installed."""
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self._lock = threading.Lock()
+        self._connect = sqlite3.connect
+
+    def _trace(self, statement: str) -> None:
+        # Statements run by triggers are reported as "-- TRIGGER ..." comments.
+        if not statement.lstrip().startswith("--"):
+            with self._lock:
+                self.statements += 1
+
+    def _traced_connect(self, *args, **kwargs):
+        conn = self._connect(*args, **kwargs)
+        conn.set_trace_callback(self._trace)
+        return conn
+
+    def reset(self) -> None:
+        with self._lock:
+            self.statements = 0
+
+    def __enter__(self):
+        sqlite3.connect = self._traced_connect
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        sqlite3.connect = self._connect
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    seconds: float
+    counts: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"seconds": round(self.seconds, 4), "counts": dict(self.counts)}
+
+
+class BenchEnv:
+    """Fake servers plus factories for app objects wired to them."""
+
+    def __init__(self, api: FakeRickMortyAPI, llm_api: FakeOpenAI, sql: _SQLiteCounter):
+        self.api = api
+        self.llm_api = llm_api
+        self.sql = sql
+        self._async_clients: List[AsyncRickMortyClient] = []
+
+    def client(self, cache: bool = False) -> RickMortyClient:
+        return RickMortyClient(base_url=self.api.api_url, cache=ResponseCache() if cache else None)
+
+    def async_client(self) -> AsyncRickMortyClient:
+        client = AsyncRickMortyClient(base_url=self.api.api_url)
+        self._async_clients.append(client)
+        return client
+
+    def close_clients(self) -> None:
+        # Stops the loop threads the async clients' sync wrappers started.
+        while self._async_clients:
+            self._async_clients.pop().close()
+
+    def big_location(self, client: RickMortyClient) -> Dict[str, Any]:
+        return client.get_by_ids("location", [BIG_LOCATION_ID])[0]
+
+    def notes_repo(self) -> NotesRepository:
+        repo = NotesRepository()
+        repo.add_notes(SEED_NOTES)
+        return repo
+
+    def residents(self, client: RickMortyClient, notes_repo: NotesRepository) -> List[Dict[str, Any]]:
+        dataset = ResidentDataset(self.big_location(client), client.get_characters_by_urls, notes_repo)
+        return dataset.all()
+
+    def reset_counts(self) -> None:
+        self.api.reset_counts()
+        self.llm_api.reset_counts()
+        self.sql.reset()
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "api_requests": self.api.counts["requests"],
+            "api_429": self.api.counts["429"],
+            "llm_chat_calls": self.llm_api.counts["chat"],
+            "llm_429": self.llm_api.counts["429"],
+            "embedding_calls": self.llm_api.counts["embeddings"],
+            "embedding_inputs": self.llm_api.counts["embedding_inputs"],
+            "db_statements": self.sql.statements,
+        }
+
+
+# A scenario does its (unmeasured) setup and returns the step to time.
+Scenario = Callable[[BenchEnv], Callable[[], Any]]
+SCENARIOS: Dict[str, Scenario] = {}
+
+
+def scenario(func: Scenario) -> Scenario:
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+@scenario
+def load_locations(env: BenchEnv):
+    client = env.client()
+    return client.get_all_locations
+
+
+@scenario
+def load_locations_cached(env: BenchEnv):
+    client = env.client(cache=True)
+    client.get_all_locations()
+    return client.get_all_locations
+
+
+@scenario
+def load_characters_rate_limited(env: BenchEnv):
+    client = env.client()
+
+    def run():
+        env.api.rate_limit_every = 4
+        try:
+            return client.get_all_characters()
+        finally:
+            env.api.rate_limit_every = 0
+    return run
+
+
+@scenario
+def resolve_residents_per_url(env: BenchEnv):
+    """The original one-request-per-resident pattern, kept as a reference point."""
+    client = env.client()
+    notes_repo = env.notes_repo()
+    location = env.big_location(client)
+
+    def run():
+        return [
+            {"character": c, "notes": [n for n, _ in notes_repo.get_notes(c["id"])]}
+            for c in (client.get_character_by_url(url) for url in location["residents"])
+        ]
+    return run
+
+
+@scenario
+def resolve_residents(env: BenchEnv):
+    client = env.client()
+    notes_repo = env.notes_repo()
+    location = env.big_location(client)
+
+    def run():
+        dataset = ResidentDataset(location, client.get_characters_by_urls, notes_repo)
+        dataset.page(0)
+        return dataset.all()
+    return run
+
+
+@scenario
+def resolve_residents_async(env: BenchEnv):
+    location = env.big_location(env.client())
+    client = env.async_client()
+    return lambda: client.get_characters_by_urls_sync(location["residents"])
+
+
+@scenario
+def resolve_residents_async_concurrent(env: BenchEnv):
+    """Several threads share one async client, as Streamlit sessions and the prefetch thread do."""
+    location = env.big_location(env.client())
+    client = env.async_client()
+    callers = 4
+
+    def run():
+        with ThreadPoolExecutor(max_workers=callers) as pool:
+            results = list(pool.map(client.get_characters_by_urls_sync, [location["residents"]] * callers))
+        wrong = [len(r) for r in results if len(r) != len(location["residents"])]
+        if wrong:
+            raise AssertionError(f"expected {len(location['residents'])} residents per call, got {wrong}")
+        return results
+    return run
+
+
+@scenario
+def search_cold(env: BenchEnv):
+    notes_repo = env.notes_repo()
+    characters = [r["character"] for r in env.residents(env.client(), notes_repo)]
+
+    def run():
+        index = CharacterIndex(EmbeddingService(), notes_repo)
+        index.ensure(characters)
+        return index.search("dead alien with a portal gun", k=5)
+    return run
+
+
+@scenario
+def search_warm(env: BenchEnv):
+    notes_repo = env.notes_repo()
+    characters = [r["character"] for r in env.residents(env.client(), notes_repo)]
+    index = CharacterIndex(EmbeddingService(), notes_repo)
+    index.ensure(characters)
+    index.search("warm-up query", k=5)
+
+    def run():
+        notes_repo.add_note(7, "Now a pickle again")
+        index.ensure(characters)
+        return index.search("pickle", k=5)
+    return run
+
+
+@scenario
+def summary(env: BenchEnv):
+    location = env.big_location(env.client())
+    residents = env.residents(env.client(), env.notes_repo())
+    llm = LLMService()
+    return lambda: "".join(llm.stream_location_summary(location, residents))
+
+
+@scenario
+def summary_cached(env: BenchEnv):
+    location = env.big_location(env.client())
+    residents = env.residents(env.client(), env.notes_repo())
+    llm = LLMService()
+    "".join(llm.stream_location_summary(location, residents))
+    return lambda: "".join(llm.stream_location_summary(location, residents))
+
+
+@scenario
+def summary_rate_limited(env: BenchEnv):
+    """Every third OpenAI request gets a 429; the scheduler must retry its way through."""
+    location = env.big_location(env.client())
+    residents = env.residents(env.client(), env.notes_repo())
+    # Short backoff keeps the jittered retry delays from dominating the timing.
+    llm = LLMService(scheduler=OpenAIScheduler(backoff_base_s=0.05))
+
+    def run():
+        env.llm_api.rate_limit_every = 3
+        try:
+            return "".join(llm.stream_location_summary(location, residents))
+        finally:
+            env.llm_api.rate_limit_every = 0
+    return run
+
+
+@scenario
+def evaluation(env: BenchEnv):
+    location = env.big_location(env.client())
+    residents = env.residents(env.client(), env.notes_repo())
+    llm = LLMService()
+    text = llm.generate_location_summary(location, residents)
+    evaluator = Evaluator(embedding_service=EmbeddingService())
+    return lambda: evaluator.evaluate_pipeline(text, location, residents=residents, llm=llm)
+
+
+@contextlib.contextmanager
+def _workdir() -> Iterator[None]:
+    # App caches use relative `db/...` paths, so a fresh cwd means fresh caches.
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="rm-bench-") as tmp:
+        os.chdir(tmp)
+        try:
+            yield
+        finally:
+            os.chdir(previous)
+
+
+def run_scenario(env: BenchEnv, name: str, repeat: int) -> ScenarioResult:
+    timings: List[float] = []
+    counts: Dict[str, int] = {}
+    for _ in range(repeat):
+        with _workdir():
+            step = SCENARIOS[name](env)
+            env.reset_counts()
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                return ScenarioResult(name, time.perf_counter() - started, env.counts(), f"{type(e).__name__}: {e}")
+            finally:
+                env.close_clients()
+            timings.append(time.perf_counter() - started)
+            counts = env.counts()
+    return ScenarioResult(name, statistics.median(timings), counts)
+
+
+def compare(results: List[ScenarioResult], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Human-readable regressions of `results` against `baseline["scenarios"]`."""
+    regressions = []
+    for result in results:
+        if result.error:
+            regressions.append(f"{result.name}: failed with {result.error}")
+            continue
+        base = baseline.get("scenarios", {}).get(result.name)
+        if base is None:
+            continue
+        for key, value in result.counts.items():
+            if value > base["counts"].get(key, 0):
+                regressions.append(f"{result.name}: {key} {base['counts'].get(key, 0)} -> {value}")
+        allowed = base["seconds"] * (1 + tolerance)
+        if result.seconds > allowed and result.seconds - base["seconds"] > MIN_SLOWDOWN_S:
+            regressions.append(f"{result.name}: {base['seconds']:.3f}s -> {result.seconds:.3f}s")
+    return regressions
+
+
+def print_table(results: List[ScenarioResult], baseline: Dict[str, Any]) -> None:
+    columns = ["api_requests", "api_429", "llm_chat_calls", "llm_429", "embedding_calls", "db_statements"]
+    print(f"{'scenario':<36}{'seconds':>9}{'baseline':>10}  " + "".join(f"{c:>17}" for c in columns))
+    for result in results:
+        base = baseline.get("scenarios", {}).get(result.name)
+        base_s = f"{base['seconds']:.3f}" if base else "-"
+        print(f"{result.name:<36}{result.seconds:>9.3f}{base_s:>10}  "
+              + "".join(f"{result.counts.get(c, 0):>17}" for c in columns)
+              + (f"  FAILED: {result.error}" if result.error else ""))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the app against local fake APIs.")
+    parser.add_argument("-s", "--scenario", choices=sorted(SCENARIOS), action="append",
+                        help="run only this scenario (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; the median time is reported")
+    parser.add_argument("--api-latency-ms", type=float, default=20.0, help="latency of the fake Rick & Morty API")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="latency of the fake OpenAI API")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown before a run counts as a regression")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    names = args.scenario or list(SCENARIOS)
+
+    with FakeRickMortyAPI(latency_s=args.api_latency_ms / 1000) as api, \
+            FakeOpenAI(latency_s=args.llm_latency_ms / 1000) as llm_api, \
+            _SQLiteCounter() as sql:
+        openai.base_url = llm_api.base_url
+        openai.api_key = "benchmark"
+        env = BenchEnv(api, llm_api, sql)
+        results = [run_scenario(env, name, args.repeat) for name in names]
+
+    print_table(results, baseline)
+    report = {
+        "settings": {"api_latency_ms": args.api_latency_ms, "llm_latency_ms": args.llm_latency_ms,
+                     "repeat": args.repeat},
+        "scenarios": {r.name: r.as_dict() for r in results},
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    failed = [r.name for r in results if r.error]
+    if args.update_baseline and failed:
+        print(f"Not updating the baseline: {', '.join(failed)} failed.", file=sys.stderr)
+        sys.exit(1)
+    if args.update_baseline:
+        merged = {**baseline.get("scenarios", {}), **report["scenarios"]}
+        baseline_path.write_text(json.dumps({**report, "scenarios": merged}, indent=2) + "\n")
+        print(f"Baseline written to {baseline_path}")
+        return
+
+    if baseline.get("settings") and baseline["settings"] != report["settings"]:
+        print("Note: settings differ from the baseline; timings are not comparable.", file=sys.stderr)
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""`CharacterIndex` keyword and hybrid search against the local fake OpenAI embeddings endpoint."""
+
+import openai
+import pytest
+
+from app.llm.embedding_cache import EmbeddingCache
+from app.llm.embeddings import EmbeddingService
+from app.llm.openai_scheduler import OpenAIScheduler
+from app.persistence.notes_repository import NotesRepository
+from app.search.character_index import CharacterIndex
+from benchmarks.fake_servers import FakeOpenAI, build_universe
+
+NOTES = [
+    (3, "Keeps a portal gun hidden in the garage"),
+    (7, "Turned himself into a pickle to avoid therapy"),
+    (12, "Stole a portal gun from the Citadel"),
+    (25, "Afraid of squirrels since the incident"),
+    (40, "Sells portal fluid on the side"),
+]
+
+CHARACTERS = build_universe(n_characters=60)["character"]
+BY_ID = {c["id"]: c for c in CHARACTERS}
+
+
+def fetch_characters(ids):
+    return [BY_ID[i] for i in ids if i in BY_ID]
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    with FakeOpenAI(latency_s=0.0) as server:
+        monkeypatch.setattr(openai, "base_url", server.base_url)
+        monkeypatch.setattr(openai, "api_key", "test")
+        yield server
+
+
+@pytest.fixture
+def notes_repo(tmp_path):
+    repo = NotesRepository(db_path=str(tmp_path / "notes.db"))
+    repo.add_notes(NOTES)
+    return repo
+
+
+def make_index(notes_repo):
+    embeddings = EmbeddingService(cache=EmbeddingCache(path=None), scheduler=OpenAIScheduler())
+    return CharacterIndex(embeddings, notes_repo, path=None)
+
+
+def test_keyword_search_on_cold_index_makes_no_embedding_requests(fake_openai, notes_repo):
+    index = make_index(notes_repo)
+
+    matches = index.keyword_search("portal gun", k=5, fetch_characters=fetch_characters)
+
+    assert {meta["id"] for meta, _ in matches} == {3, 12, 40}
+    assert matches[0][0]["id"] in (3, 12)  # both notes match both words
+    assert all("portal" in meta["document"] for meta, _ in matches)
+    assert [score for _, score in matches] == [1.0, 0.5, 1 / 3]
+    assert len(index) == 0
+    assert fake_openai.counts["requests"] == 0
+
+
+def test_keyword_search_filters_on_character_records(fake_openai, notes_repo):
+    index = make_index(notes_repo)
+    status = BY_ID[12]["status"]
+
+    matches = index.keyword_search("portal", where={"status": status}, ids=[3, 12, 40],
+                                   fetch_characters=fetch_characters)
+
+    assert {meta["id"] for meta, _ in matches} == {i for i in (3, 12, 40) if BY_ID[i]["status"] == status}
+    assert fake_openai.counts["requests"] == 0
+
+
+def test_hybrid_ranking_is_reproducible(fake_openai, notes_repo):
+    first = make_index(notes_repo)
+    first.add(CHARACTERS)
+    second = make_index(notes_repo)
+    second.add(list(reversed(CHARACTERS)))
+
+    def ranking(index):
+        return [(meta["id"], round(score, 9)) for meta, score in index.search("dead alien with a portal gun", k=10)]
+
+    expected = ranking(first)
+    assert len(expected) == 10
+    # Same query, same data: identical order and scores, whatever the insertion order.
+    assert ranking(first) == expected
+    assert ranking(second) == expected
+    # Keyword hits are fused in.
+    assert {3, 12, 40} <= {item_id for item_id, _ in expected}
+
+
+def test_note_added_during_embed_is_not_lost(fake_openai, notes_repo):
+    index = make_index(notes_repo)
+    index.add(CHARACTERS[:10])
+    notes_repo.add_note(3, "Sold the garage")
+    embed_many = index.embedding_service.embed_many
+
+    def embed_many_racing_a_note(texts):
+        # Another session saves a note after this refresh has read character 3's notes.
+        if not notes_repo.get_notes(3)[0][0].startswith("Now"):
+            notes_repo.add_note(3, "Now lives on the Citadel")
+        return embed_many(texts)
+
+    index.embedding_service.embed_many = embed_many_racing_a_note
+    index.refresh()
+    assert "Sold the garage" not in index.index.get_metadata(3)["document"]
+    assert 3 in index._dirty
+
+    index.refresh()
+    assert "Now lives on the Citadel" in index.index.get_metadata(3)["document"]
+    assert not index._dirty
@@ -0,0 +1,117 @@
+"""`LLMService` streaming against the local fake OpenAI streaming endpoint."""
+
+import json
+import time
+
+import openai
+import pytest
+
+from app.llm.llm_cache import LLMCache
+from app.llm.llm_service import SUMMARY_TEMPERATURE, LLMService
+from app.llm.openai_scheduler import OpenAIScheduler
+from app.metrics import collect
+from benchmarks.fake_servers import FakeOpenAI
+
+PROMPT = "You are a Rick & Morty narrator.\nLocation Name: Citadel of Ricks\nSummarize it."
+
+LOCATION = {"id": 3, "name": "Citadel of Ricks", "type": "Space station", "dimension": "unknown"}
+RESIDENTS = [
+    {"character": {"id": 1, "name": "Rick Sanchez", "status": "Alive", "species": "Human"},
+     "notes": ["Runs the Citadel's best bar"]},
+    {"character": {"id": 8, "name": "Adjudicator Rick", "status": "Dead", "species": "Human"}, "notes": []},
+]
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    # Each word is sent as its own chunk, spaced out so incremental delivery is observable.
+    with FakeOpenAI(latency_s=0.0, token_latency_s=0.02) as server:
+        monkeypatch.setattr(openai, "base_url", server.base_url)
+        monkeypatch.setattr(openai, "api_key", "test")
+        yield server
+
+
+@pytest.fixture
+def llm(tmp_path):
+    return LLMService(cache=LLMCache(path=str(tmp_path / "llm_cache.db")), scheduler=OpenAIScheduler())
+
+
+def expected_usage(prompt):
+    # Mirrors the usage the fake reports in its final `include_usage` chunk.
+    return (len(prompt) + len(FakeOpenAI.reply(prompt))) // 4
+
+
+def consume(stream):
+    started = time.perf_counter()
+    deltas, arrivals = [], []
+    for delta in stream:
+        deltas.append(delta)
+        arrivals.append(time.perf_counter() - started)
+    return deltas, arrivals
+
+
+def test_stream_yields_deltas_incrementally(fake_openai, llm):
+    deltas, arrivals = consume(llm._stream(PROMPT, SUMMARY_TEMPERATURE))
+
+    assert "".join(deltas).strip() == FakeOpenAI.reply(PROMPT)
+    assert len(deltas) > 5
+    # The first delta must not wait for the whole completion.
+    assert arrivals[0] < arrivals[-1] / 2
+    assert fake_openai.counts["chat"] == 1
+
+
+def test_stream_records_usage_from_final_chunk(fake_openai, llm):
+    with collect() as metrics:
+        consume(llm._stream(PROMPT, SUMMARY_TEMPERATURE))
+
+    assert metrics.stages()["llm.chat_stream"].tokens == expected_usage(PROMPT)
+
+
+def test_stream_caches_complete_text(fake_openai, llm):
+    deltas, _ = consume(llm._stream(PROMPT, SUMMARY_TEMPERATURE))
+    key = llm.cache.make_key(llm.model, SUMMARY_TEMPERATURE, PROMPT)
+    assert llm.cache.get(key) == "".join(deltas).strip()
+
+    saved_before = llm.cache.stats()["tokens_saved"]
+    cached, _ = consume(llm._stream(PROMPT, SUMMARY_TEMPERATURE))
+
+    # A cached answer comes back in one piece, without another request, and
+    # the hit credits the usage recorded when the stream was first read.
+    assert cached == ["".join(deltas).strip()]
+    assert fake_openai.counts["chat"] == 1
+    assert llm.cache.stats()["tokens_saved"] - saved_before == expected_usage(PROMPT)
+
+
+def test_stream_refresh_bypasses_and_overwrites_cache(fake_openai, llm):
+    key = llm.cache.make_key(llm.model, SUMMARY_TEMPERATURE, PROMPT)
+    llm.cache.put(key, llm.model, "stale answer", 1)
+
+    deltas, _ = consume(llm._stream(PROMPT, SUMMARY_TEMPERATURE, refresh=True))
+
+    assert len(deltas) > 1
+    assert fake_openai.counts["chat"] == 1
+    assert llm.cache.get(key) == FakeOpenAI.reply(PROMPT)
+
+
+def test_stream_location_summary(fake_openai, llm):
+    prompt = llm.build_location_prompt(LOCATION, RESIDENTS)
+
+    deltas, _ = consume(llm.stream_location_summary(LOCATION, RESIDENTS))
+
+    assert len(deltas) > 1
+    assert "".join(deltas).strip() == FakeOpenAI.reply(prompt)
+    assert fake_openai.counts["chat"] == 1
+
+
+def test_stream_judge_verdict_shares_cache_with_generate(fake_openai, llm):
+    summary = FakeOpenAI.reply(llm.build_location_prompt(LOCATION, RESIDENTS))
+    prompt = llm.build_judge_prompt(LOCATION, RESIDENTS, summary)
+
+    deltas, _ = consume(llm.stream_judge_verdict(prompt))
+    verdict = "".join(deltas).strip()
+
+    assert len(deltas) > 1
+    assert json.loads(verdict)["verdict"]
+    # Same prompt and temperature as the blocking call, so it is answered from the cache.
+    assert llm.generate_judge_verdict(prompt) == verdict
+    assert fake_openai.counts["chat"] == 1
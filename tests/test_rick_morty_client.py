@@ -0,0 +1,66 @@
+"""Rick & Morty API clients against the local fake API."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.api.response_cache import ResponseCache
+from app.api.rick_morty_client import AsyncRickMortyClient, RickMortyClient
+from app.metrics import collect
+from benchmarks.fake_servers import FakeRickMortyAPI
+
+
+@pytest.fixture
+def fake_api():
+    with FakeRickMortyAPI(latency_s=0.0) as server:
+        yield server
+
+
+@pytest.fixture
+def async_client(fake_api):
+    client = AsyncRickMortyClient(base_url=fake_api.api_url)
+    yield client
+    client.close()
+
+
+def character_url(fake_api, character_id):
+    return f"{fake_api.api_url}/character/{character_id}"
+
+
+def test_sync_wrappers_keep_one_connection_alive(fake_api, async_client):
+    for character_id in range(1, 6):
+        assert async_client.get_character_by_url_sync(character_url(fake_api, character_id))["id"] == character_id
+
+    assert fake_api.counts["requests"] == 5
+    assert fake_api.counts["connections"] == 1
+
+
+def test_sync_wrappers_are_safe_to_share_across_threads(fake_api, async_client):
+    urls = [character_url(fake_api, i) for i in range(1, 151)]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(async_client.get_characters_by_urls_sync, [urls] * 4))
+
+    assert [[c["id"] for c in r] for r in results] == [list(range(1, 151))] * 4
+
+
+def test_sync_wrappers_record_into_callers_collector(fake_api, async_client):
+    with collect() as metrics:
+        async_client.get_character_by_url_sync(character_url(fake_api, 1))
+
+    assert metrics.stages()["api.get_json"].calls == 1
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_get_by_ids_drops_unknown_ids(fake_api, cache):
+    client = RickMortyClient(base_url=fake_api.api_url, cache=ResponseCache(path=None) if cache else None)
+
+    assert client.get_by_ids("character", [9999]) == []
+    assert client.get_by_ids("character", [9999, 10000]) == []
+    assert [c["id"] for c in client.get_by_ids("character", [9999, 2])] == [2]
+
+
+def test_async_get_characters_by_urls_drops_unknown_ids(fake_api, async_client):
+    assert async_client.get_characters_by_urls_sync([character_url(fake_api, 9999)]) == []
+    urls = [character_url(fake_api, 9999), character_url(fake_api, 2)]
+    assert [c["id"] for c in async_client.get_characters_by_urls_sync(urls)] == [2]